@@ -0,0 +1,129 @@
+import hashlib
+import os
+import pickle
+import tempfile
+
+import parsetab
+
+
+# A persistent cache of parsed programs (see Interpreter(ast_cache=...)). Each
+# entry is a pickled AST, as parse_program returned it and, for optimize=True,
+# after fold_constants, stored in a file named after a hash of the source and
+# the options it was parsed with.
+# Resolution and the later passes still run on every load, since they attach
+# runtime data to the nodes.
+#
+# An entry records a digest of the grammar signature from parsetab.py and
+# INTERPRETER_VERSION, and is ignored (and later overwritten) if either has
+# changed. Entries are
+# written to a temporary file and renamed into place, so concurrent writers
+# and readers only ever see whole entries. Loading an entry touches its
+# modification time, and once the directory grows past max_bytes the least
+# recently used entries are deleted. The directory's size is only listed again
+# once the entries this process has seen and written add up to more than
+# max_bytes.
+#
+# Entries are unpickled, so the directory must only be writable by people who
+# could run code as the interpreter anyway.
+
+# Changes whenever element.py's node classes, or what the parser or optimize.py
+# produce, do, so entries written by an older interpreter don't load
+INTERPRETER_VERSION = 1
+
+# The signature itself is a couple of kilobytes, often more than the AST
+GRAMMAR_DIGEST = hashlib.sha256(parsetab._lr_signature.encode("utf-8")).hexdigest()[:16]
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# Eviction goes down to this fraction of max_bytes, so a full cache isn't
+# listed again on every store
+EVICT_TO = 0.9
+SUFFIX = ".ast"
+
+
+class ASTCache:
+	def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+		self.directory = directory
+		self.max_bytes = max_bytes
+		self.hits = 0
+		self.misses = 0
+		# The directory's size as of the last listing, plus what was stored since
+		self.size = None
+		os.makedirs(directory, exist_ok=True)
+
+	# parser and lexer are parse_program's: yacc's error recovery can return a
+	# tree for a source the Pratt parser rejects, so each keeps its own entries
+	def path(self, source, optimize, parser="yacc", lexer="ply"):
+		digest = hashlib.sha256(source.encode("utf-8")).hexdigest()
+		return os.path.join(self.directory, "{}-{}-{}-{}{}".format(digest, "opt" if optimize else "raw", parser, lexer, SUFFIX))
+
+	def header(self):
+		return (GRAMMAR_DIGEST, INTERPRETER_VERSION)
+
+	# The cached AST for source, or None
+	def load(self, source, optimize, parser="yacc", lexer="ply"):
+		path = self.path(source, optimize, parser, lexer)
+		try:
+			with open(path, "rb") as f:
+				header, ast = pickle.load(f)
+			os.utime(path)
+		except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError, TypeError):
+			# Missing, being evicted, or not a complete entry
+			header = None
+		if header != self.header():
+			self.misses += 1
+			return None
+		self.hits += 1
+		return ast
+
+	def store(self, source, optimize, ast, parser="yacc", lexer="ply"):
+		try:
+			data = pickle.dumps((self.header(), ast), pickle.HIGHEST_PROTOCOL)
+		except RecursionError:
+			# Nested too deeply for pickle; the program is just parsed every time
+			return
+		if self.size is None:
+			self.evict()
+		path = self.path(source, optimize, parser, lexer)
+		try:
+			replaced = os.stat(path).st_size
+		except OSError:
+			replaced = 0
+		fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+		try:
+			with os.fdopen(fd, "wb") as f:
+				f.write(data)
+			os.replace(temp_path, path)
+		except OSError:
+			try:
+				os.remove(temp_path)
+			except OSError:
+				pass
+			return
+		self.size += len(data) - replaced
+		if self.size > self.max_bytes:
+			self.evict()
+
+	# Deletes the least recently used entries until the cache fits in
+	# EVICT_TO of max_bytes, and records the size left
+	def evict(self):
+		entries = []
+		total = 0
+		for entry in os.scandir(self.directory):
+			if not entry.name.endswith(SUFFIX):
+				continue
+			try:
+				stat = entry.stat()
+			except OSError:
+				continue
+			entries.append((stat.st_mtime, stat.st_size, entry.path))
+			total += stat.st_size
+		entries.sort()
+		for _, size, path in entries:
+			if total <= self.max_bytes * EVICT_TO:
+				break
+			try:
+				os.remove(path)
+			except OSError:
+				pass
+			total -= size
+		self.size = total
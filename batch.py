@@ -0,0 +1,63 @@
+import os
+from multiprocessing import Pool
+
+from interpreterv2 import Interpreter
+
+
+# Batch execution of one program over many input vectors (see run_batch). The
+# runs are spread over a pool of worker processes; each worker compiles the
+# program once, when it starts, and then executes it once per input vector it
+# is handed, reading that vector through InterpreterBase's input handling.
+#
+# A run's result is (inputs, output_log, error_type, exception): the input
+# vector, the lines it printed, the ErrorType it stopped with, or None, and the
+# exception it failed with outside of InterpreterBase.error, for example the
+# ValueError from an input inputi() can't convert, or None. A run that finished
+# has neither.
+
+# The worker's interpreter and compiled program
+worker_interp = None
+worker_program = None
+
+
+def init_worker(source, options, natives):
+	global worker_interp, worker_program
+	worker_interp = Interpreter(console_output=False, **options)
+	worker_interp.register_builtins(natives)
+	worker_program = worker_interp.compile(source)
+
+
+def run_inputs(inputs):
+	interp = worker_interp
+	exception = None
+	try:
+		interp.execute(worker_program, inp=inputs)
+	except Exception as e:
+		if interp.get_error_type_and_line()[0] is None:
+			exception = e
+	return inputs, interp.get_output(), interp.get_error_type_and_line()[0], exception
+
+
+# Returns an iterator over a result for each input vector in inputs, in the
+# same order if ordered is True and otherwise as the runs complete. workers is
+# the number of processes (by default one per CPU); options are passed on to
+# Interpreter, and natives are registered in each worker, so their handlers,
+# and any exceptions a run can fail with, have to be picklable.
+def run_batch(source, inputs, workers=None, ordered=True, chunksize=16, natives=(), **options):
+	workers = workers or os.cpu_count()
+	natives = list(natives)
+	# A program that doesn't compile fails here, as it would in run(), before
+	# any worker starts
+	interp = Interpreter(console_output=False, **options)
+	interp.register_builtins(natives)
+	interp.compile(source)
+	return run_pool(source, inputs, workers, ordered, chunksize, natives, options)
+
+
+def run_pool(source, inputs, workers, ordered, chunksize, natives, options):
+	inputs = (list(vector) for vector in inputs)
+	with Pool(workers, init_worker, (source, options, natives)) as pool:
+		if ordered:
+			yield from pool.imap(run_inputs, inputs, chunksize)
+		else:
+			yield from pool.imap_unordered(run_inputs, inputs, chunksize)
@@ -0,0 +1,805 @@
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from batch import run_batch
+from brewparse import make_lexer, parse_program
+from intbase import InterpreterBase
+from element import Element, Node, walk
+from environment import Environment
+from interpreterv2 import Interpreter
+from natives import standard_natives
+from scanner import Scanner
+from value import Value
+
+# Benchmarks for the interpreter. Run all of them with `python bench.py`, or
+# pick some by name, e.g. `python bench.py backends`.
+
+CATALAN = """
+func main() {
+    print(catalan(5));
+}
+
+func catalan(n)
+{
+    if (n <= 1)
+    {
+        return 1;
+    }
+    i = 0;
+    res = 0;
+    while (i < n)
+    {
+        tmp = catalan(i);
+        res = res + tmp;
+        i = i + 1;
+    }
+    return res;
+}
+"""
+
+SUM_LOOP = """
+func main() {
+    i = 0;
+    total = 0;
+    while (i < 100000) {
+        total = total + i * 2 - i / 3;
+        i = i + 1;
+    }
+    print(total);
+}
+"""
+
+NESTED_LOOPS = """
+func main() {
+    i = 0;
+    count = 0;
+    while (i < 300) {
+        j = 0;
+        while (j < 300) {
+            if (i + j > 300 && !(j == 7)) {
+                count = count + 1;
+            }
+            j = j + 1;
+        }
+        i = i + 1;
+    }
+    print(count);
+}
+"""
+
+STRING_BUILD = """
+func main() {
+    i = 0;
+    s = "";
+    while (i < 20000) {
+        if (i / 1000 * 1000 == i) {
+            s = s + "x";
+        }
+        i = i + 1;
+    }
+    print(s);
+}
+"""
+
+FIB = """
+func main() {
+    print(fib(8));
+}
+
+func fib(n) {
+    if (n < 2) {
+        return n;
+    }
+    return fib(n - 1) + fib(n - 2);
+}
+"""
+
+# The kind of code our templates generate: literal subexpressions inside hot loops
+TEMPLATED = """
+func main() {
+    i = 0;
+    total = 0;
+    label = "";
+    while (i < 20000) {
+        total = total + 60 * 60 * 24 - (3600 * 24 - 1) * 1;
+        if (!false && 2 * 2 == 4) {
+            label = "prefix" + "-" + "suffix";
+        }
+        if (false) {
+            print("debug");
+        }
+        i = i + -(-1);
+    }
+    print(total, label);
+}
+"""
+
+PROGRAMS = [
+	("catalan", CATALAN),
+	("sum_loop", SUM_LOOP),
+	("nested_loops", NESTED_LOOPS),
+	("string_build", STRING_BUILD),
+]
+
+
+def time_run(source, repeat=3, **options):
+	best = None
+	for _ in range(repeat):
+		interp = Interpreter(console_output=False, **options)
+		start = time.perf_counter()
+		interp.run(source)
+		elapsed = time.perf_counter() - start
+		if best is None or elapsed < best:
+			best = elapsed
+	return best, interp.get_output()
+
+
+def best_time(action, repeat):
+	best = None
+	for _ in range(repeat):
+		start = time.perf_counter()
+		action()
+		elapsed = time.perf_counter() - start
+		if best is None or elapsed < best:
+			best = elapsed
+	return best
+
+
+def compare(label, programs, baseline, contender):
+	print(f"{label}: {baseline} vs {contender}")
+	for name, source in programs:
+		base_time, base_output = time_run(source, **baseline)
+		time_taken, output = time_run(source, **contender)
+		if output != base_output:
+			raise AssertionError(f"{name}: output differs: {base_output} != {output}")
+		print(f"  {name:<14} {base_time * 1000:9.2f} ms {time_taken * 1000:9.2f} ms  x{base_time / time_taken:.2f}")
+
+
+def bench_backends():
+	compare("backends", PROGRAMS, {"backend": "tree"}, {"backend": "closure"})
+	compare("backends", PROGRAMS, {"backend": "tree"}, {"backend": "vm"})
+	compare("backends", PROGRAMS, {"backend": "tree"}, {"backend": "python"})
+
+
+def bench_optimize():
+	programs = PROGRAMS + [("templated", TEMPLATED)]
+	compare("optimize", programs, {}, {"optimize": True})
+	compare("optimize", programs, {"backend": "vm"}, {"backend": "vm", "optimize": True})
+
+
+# Counts the Brewin calls made while running source on the tree backend
+def count_calls(source):
+	calls = [0]
+	run_user_function = Interpreter.run_user_function
+	def counting_run_user_function(self, call_node):
+		calls[0] += 1
+		return run_user_function(self, call_node)
+	Interpreter.run_user_function = counting_run_user_function
+	try:
+		Interpreter(console_output=False).run(source)
+	finally:
+		Interpreter.run_user_function = run_user_function
+	return calls[0]
+
+
+# Time per Brewin call on recursion-heavy programs, with parsing excluded
+def bench_calls():
+	print("calls: time per call")
+	for name, source in [("fib", FIB), ("catalan", CATALAN)]:
+		parse_time = best_time(lambda: parse_program(source), 50)
+		calls = count_calls(source)
+		for backend in ["tree", "closure", "vm", "python"]:
+			interp = Interpreter(console_output=False, backend=backend)
+			run_time = best_time(lambda: interp.run(source), 50)
+			print(f"  {name:<8} {backend:<8} {calls:4} calls {(run_time - parse_time) / calls * 1e6:8.2f} us/call")
+
+
+TAIL_COUNT = """
+func main() {
+    print(count(N, 0));
+}
+
+func count(n, acc) {
+    if (n == 0) {
+        return acc;
+    }
+    return count(n - 1, acc + 1);
+}
+"""
+
+DEEP_SUM = """
+func main() {
+    print(sum(N));
+}
+
+func sum(n) {
+    if (n == 0) {
+        return 0;
+    }
+    return n + sum(n - 1);
+}
+"""
+
+
+# Deep recursion: tail calls run in a loop on every backend, the vm runs
+# ordinary calls on its own stack, and the others run them on a deep-stack
+# thread past the default max_call_depth
+def bench_recursion():
+	print("recursion: depth 20000, max_call_depth=100000")
+	for name, template, backends in [("tail count", TAIL_COUNT, ["tree", "closure", "vm"]), ("deep sum", DEEP_SUM, ["tree", "closure", "vm", "python", "tiered"])]:
+		source = template.replace("N", "20000")
+		for backend in backends:
+			time_taken, output = time_run(source, backend=backend, max_call_depth=100000)
+			print(f"  {name:<11} {backend:<8} {time_taken * 1000:9.2f} ms  {output}")
+
+
+# The tiered backend against the tree-walker and the always-compiled backend,
+# with its promotions at a few thresholds
+def bench_tiers():
+	programs = PROGRAMS + [("fib(20)", FIB.replace("fib(8)", "fib(20)"))]
+	compare("tiers", programs, {"backend": "tree"}, {"backend": "tiered"})
+	compare("tiers", programs, {"backend": "python"}, {"backend": "tiered"})
+	for threshold in [10, 1000, 100000]:
+		interp = Interpreter(console_output=False, backend="tiered", tier_threshold=threshold)
+		interp.run(programs[-1][1])
+		print(f"  fib(20) tier_threshold={threshold}: " + "; ".join(interp.tiering.report()))
+
+
+# Operator quickening on the tree-walker, and how often the fast paths hit
+def bench_quicken():
+	compare("quicken", PROGRAMS, {}, {"quicken": True})
+	interp = Interpreter(console_output=False, quicken=True)
+	interp.run(NESTED_LOOPS)
+	for line in interp.quickening_report():
+		print(f"  nested_loops {line}")
+
+
+# Type checks skipped by static inference on the tree-walker
+def bench_infer():
+	compare("infer_types", PROGRAMS, {}, {"infer_types": True})
+
+
+# Frames pushed by if/while blocks and calls; blocks that don't assign
+# anything directly no longer push one
+def bench_frames():
+	print("frames: push_frame calls, and time")
+	push_frame = Environment.push_frame
+	for name, source in PROGRAMS:
+		pushed = [0]
+		def counting_push_frame(self):
+			pushed[0] += 1
+			push_frame(self)
+		Environment.push_frame = counting_push_frame
+		try:
+			Interpreter(console_output=False).run(source)
+		finally:
+			Environment.push_frame = push_frame
+		time_taken, _ = time_run(source)
+		print(f"  {name:<14} {pushed[0]:8} frames {time_taken * 1000:9.2f} ms")
+
+
+HELPERS = """
+func main() {
+    i = 0;
+    total = 0;
+    while (i < 5000) {
+        total = total + abs(i - 2500) + max(i, 1000) - min(i, 1000);
+        i = i + 1;
+    }
+    print(total);
+}
+
+func abs(n) {
+    if (n < 0) {
+        return -n;
+    }
+    return n;
+}
+
+func min(a, b) {
+    if (a < b) {
+        return a;
+    }
+    return b;
+}
+
+func max(a, b) {
+    if (a > b) {
+        return a;
+    }
+    return b;
+}
+"""
+
+
+# Brewin helpers against the same helpers registered as native builtins
+def bench_natives():
+	print("natives: Brewin abs/min/max vs native")
+	for backend in ["tree", "closure", "vm", "python"]:
+		base_time, base_output = time_run(HELPERS, backend=backend)
+		best = None
+		for _ in range(3):
+			interp = Interpreter(console_output=False, backend=backend)
+			interp.register_builtins(standard_natives)
+			start = time.perf_counter()
+			interp.run(HELPERS)
+			elapsed = time.perf_counter() - start
+			if best is None or elapsed < best:
+				best = elapsed
+		if interp.get_output() != base_output:
+			raise AssertionError(f"output differs: {base_output} != {interp.get_output()}")
+		print(f"  {backend:<8} {base_time * 1000:9.2f} ms {best * 1000:9.2f} ms  x{base_time / best:.2f}")
+
+
+# A loop whose guards usually fail on their cheap left operand
+GUARDED = """
+func main() {
+    i = 0;
+    count = 0;
+    while (i < 5000) {
+        if (i / 100 * 100 == i && expensive(i)) {
+            count = count + 1;
+        }
+        if (i < 4990 || expensive(i)) {
+            count = count + 1;
+        }
+        i = i + 1;
+    }
+    print(count);
+}
+
+func expensive(n) {
+    j = 0;
+    while (j < 20) {
+        j = j + 1;
+    }
+    return n / 2 * 2 == n;
+}
+"""
+
+
+def bench_short_circuit():
+	for backend in ["tree", "closure", "vm"]:
+		compare("short_circuit", [("guarded", GUARDED)], {"backend": backend}, {"backend": backend, "short_circuit": True})
+
+
+# fib(20) without and with memoization, and the cache stats at a few sizes
+def bench_memoize():
+	source = FIB.replace("fib(8)", "fib(20)")
+	compare("memoize", [("fib(20)", source)], {}, {"memoize": True})
+	for size in [4, 16, 1024]:
+		interp = Interpreter(console_output=False, memoize=True, memo_size=size)
+		interp.run(source)
+		print(f"  memo_size={size:<5} " + "; ".join(interp.memo.report()))
+
+
+# A straight-line program of roughly `lines` lines mixing the common node types
+def generate_program(lines):
+	body = ["    x0 = 1;", "    y = 2;"]
+	i = 1
+	while len(body) < lines - 2:
+		match i % 4:
+			case 0:
+				body.append(f"    x{i} = x{i - 1} * 3 + {i} - (y / 2);")
+			case 1:
+				body.append(f"    x{i} = !(x{i - 1} > {i}) && true;")
+			case 2:
+				body.append(f"    if (y < {i}) {{ print(\"v\", x{i - 1}); }} else {{ x{i} = -y; }}")
+			case 3:
+				body.append(f"    while (y > {i}) {{ y = y - 1; }} x{i} = f(x{i - 2}, \"s\");")
+		i += 1
+	return "func main() {\n" + "\n".join(body) + "\n}\n\nfunc f(a, b) {\n    return a;\n}\n"
+
+
+# The Element class as it was before the typed nodes: every field in a per-node dict
+class DictElement:
+	def __init__(self, elem_type, **kwargs):
+		self.elem_type = elem_type
+		self.dict = {}
+		for key, value in kwargs.items():
+			self.dict[key] = value
+
+
+def copy_tree(node, make_node):
+	if isinstance(node, list):
+		return [copy_tree(item, make_node) for item in node]
+	if not isinstance(node, Element):
+		return node
+	return make_node(node, {key: copy_tree(value, make_node) for key, value in node.items()})
+
+
+def make_dict_element(node, fields):
+	return DictElement(node.elem_type, **fields)
+
+
+def make_typed_node(node, fields):
+	if not isinstance(node, Node):
+		return Element(node.elem_type, **fields)
+	copy = type(node).__new__(type(node))
+	copy.elem_type = node.elem_type
+	for key, value in fields.items():
+		setattr(copy, key, value)
+	return copy
+
+
+def allocated_by(action):
+	tracemalloc.start()
+	before = tracemalloc.get_traced_memory()[0]
+	result = action()
+	after = tracemalloc.get_traced_memory()[0]
+	tracemalloc.stop()
+	return result, after - before
+
+
+# Memory used by the AST of a 50k-line program, with dict-backed nodes vs the slotted typed nodes
+def bench_memory():
+	ast = parse_program(generate_program(50000))
+	nodes = sum(1 for _ in walk(ast))
+	_, dict_bytes = allocated_by(lambda: copy_tree(ast, make_dict_element))
+	_, typed_bytes = allocated_by(lambda: copy_tree(ast, make_typed_node))
+	print(f"memory: 50000-line program, {nodes} nodes (node lists included)")
+	print(f"  dict-backed Element {dict_bytes / 1e6:8.2f} MB {dict_bytes / nodes:7.1f} bytes/node")
+	print(f"  slotted nodes       {typed_bytes / 1e6:8.2f} MB {typed_bytes / nodes:7.1f} bytes/node")
+
+
+# A tight loop whose ints stay inside the interned range, and the same loop
+# shifted past it so every arithmetic result needs a fresh Value
+SMALL_INT_LOOP = """
+func main() {
+    i = 0;
+    count = 0;
+    while (i < 1000) {
+        if (i / 2 * 2 == i && !(i == 7)) {
+            count = count + 1;
+        }
+        i = i + 1;
+    }
+    print(count);
+}
+"""
+
+LARGE_INT_LOOP = SMALL_INT_LOOP.replace("i = 0;", "i = 100000;").replace("i < 1000", "i < 101000")
+
+
+# The Value class as it was before: a plain object with a __dict__ and a return flag
+class DictValue:
+	def __init__(self, type, val=None, ret=False):
+		self.elem_type = type
+		self.v = val
+		self.r = ret
+
+
+# Counts the Values constructed while action runs
+def values_built_by(action):
+	built = [0]
+	init = Value.__init__
+	def counting_init(self, *args):
+		built[0] += 1
+		init(self, *args)
+	Value.__init__ = counting_init
+	try:
+		action()
+	finally:
+		Value.__init__ = init
+	return built[0]
+
+
+# Value allocation churn in a 1000-iteration while loop. The previous Value
+# allocated one object per literal, comparison and arithmetic result; now
+# literals and bools are shared and only results outside the interned int range
+# (or strings) are built. Sizes are measured with tracemalloc.
+def bench_allocations():
+	_, dict_bytes = allocated_by(lambda: [DictValue(InterpreterBase.INT_DEF, i) for i in range(1000)])
+	_, slotted_bytes = allocated_by(lambda: [Value(InterpreterBase.INT_DEF, i) for i in range(1000)])
+	print(f"allocations: {dict_bytes / 1000:.1f} bytes per dict-backed Value, {slotted_bytes / 1000:.1f} per slotted Value")
+	for name, source in [("small ints", SMALL_INT_LOOP), ("large ints", LARGE_INT_LOOP)]:
+		for backend in ["tree", "closure", "vm"]:
+			interp = Interpreter(console_output=False, backend=backend)
+			built = values_built_by(lambda: interp.run(source))
+			print(f"  {name:<11} {backend:<8} {built:6} Values built {built * slotted_bytes / 1000 / 1e3:8.1f} KB churned")
+
+
+# Time per operator in a left-deep chain `a + a + ... + a`, run enough times
+# that every depth evaluates about a million operators. Chains deeper than
+# resolver.DEEP_EXPRESSION are evaluated with an explicit stack rather than recursively.
+def bench_deep():
+	print("deep: time per operator, parsing excluded")
+	for depth in [10, 100, 1000, 10000, 100000]:
+		repeat = max(10, 1000000 // depth)
+		source = "func main() { a = 1; i = 0; while (i < %d) { x = %s; i = i + 1; } }" % (repeat, " + ".join(["a"] * (depth + 1)))
+		parse_time = best_time(lambda: parse_program(source), 3)
+		for backend in ["tree", "vm"]:
+			interp = Interpreter(console_output=False, backend=backend)
+			run_time = best_time(lambda: interp.run(source), 3)
+			print(f"  depth {depth:<7} {backend:<5} {(run_time - parse_time) / (depth * repeat) * 1e9:8.1f} ns/op")
+
+
+GRADE = """
+func main() {
+    n = inputi();
+    total = 0;
+    while (n > 0) {
+        total = total + n * n;
+        n = n - 1;
+    }
+    print(total);
+}
+"""
+
+
+# One program run over many inputs, re-parsed by run() every time versus
+# compiled once and executed for each input
+def bench_compile():
+	inputs = [[str(i)] for i in range(500)]
+	print(f"compile: {len(inputs)} runs of one program")
+	for backend in ["tree", "vm", "python"]:
+		def run_each():
+			for inp in inputs:
+				Interpreter(console_output=False, inp=inp, backend=backend).run(GRADE)
+		def execute_each():
+			interp = Interpreter(console_output=False, backend=backend)
+			program = interp.compile(GRADE)
+			for inp in inputs:
+				interp.execute(program, inp=inp)
+		run_time = best_time(run_each, 3)
+		execute_time = best_time(execute_each, 3)
+		print(f"  {backend:<8} run {run_time * 1000:9.2f} ms   compile+execute {execute_time * 1000:9.2f} ms   {run_time / execute_time:5.2f}x")
+
+
+# The same runs executed one after another in this process, and through
+# run_batch with different numbers of worker processes
+def bench_batch():
+	inputs = [[str(i % 500)] for i in range(2000)]
+	print(f"batch: {len(inputs)} runs of one program")
+	def serial():
+		interp = Interpreter(console_output=False)
+		program = interp.compile(GRADE)
+		for inp in inputs:
+			interp.execute(program, inp=inp)
+	print(f"  serial                 {best_time(serial, 1) * 1000:9.2f} ms")
+	for workers in [1, 2, 4]:
+		for ordered in [True, False]:
+			batch_time = best_time(lambda: list(run_batch(GRADE, inputs, workers=workers, ordered=ordered)), 1)
+			print(f"  {workers} workers {'ordered' if ordered else 'as completed':<12} {batch_time * 1000:9.2f} ms")
+
+
+# Compiling each program with an empty AST cache, which parses it and writes
+# the entry, and then again with the entry on disk
+def bench_ast_cache():
+	print("ast_cache: compile time, parsing vs loading from the cache")
+	with tempfile.TemporaryDirectory() as directory:
+		for name, source in PROGRAMS:
+			def cold():
+				for entry in os.scandir(directory):
+					os.remove(entry.path)
+				Interpreter(console_output=False, ast_cache=directory).compile(source)
+			cold_time = best_time(cold, 20)
+			warm_time = best_time(lambda: Interpreter(console_output=False, ast_cache=directory).compile(source), 20)
+			print(f"  {name:<14} parse {cold_time * 1000:8.2f} ms   cached {warm_time * 1000:8.2f} ms   x{cold_time / warm_time:5.2f}")
+
+
+STARTUP = """
+import time
+start = time.perf_counter()
+from interpreterv2 import Interpreter
+imported = time.perf_counter()
+Interpreter(console_output=False, ast_cache={ast_cache!r}).run("func main() {{ print(1); }}")
+print(imported - start, time.perf_counter() - imported)
+"""
+
+# Cold-start budget for importing interpreterv2 in a fresh process, in ms
+IMPORT_BUDGET_MS = 25
+
+
+# Fresh processes importing the interpreter and running a one-line program,
+# parsing it or loading it from a warm AST cache (which doesn't import PLY)
+def bench_startup():
+	print(f"startup: fresh process, best of 10 (import budget {IMPORT_BUDGET_MS} ms)")
+	directory = os.path.dirname(os.path.abspath(__file__))
+	with tempfile.TemporaryDirectory() as cache_directory:
+		for label, ast_cache in [("parse", None), ("ast_cache", cache_directory)]:
+			best = None
+			for _ in range(10):
+				start = time.perf_counter()
+				result = subprocess.run([sys.executable, "-c", STARTUP.format(ast_cache=ast_cache)], cwd=directory, capture_output=True, text=True, check=True)
+				total = time.perf_counter() - start
+				import_time, run_time = map(float, result.stdout.split())
+				if best is None or total < best[0]:
+					best = (total, import_time, run_time)
+			total, import_time, run_time = best
+			status = "ok" if import_time * 1000 <= IMPORT_BUDGET_MS else "OVER BUDGET"
+			print(f"  {label:<10} import {import_time * 1000:7.2f} ms ({status})   first run {run_time * 1000:7.2f} ms   process {total * 1000:7.2f} ms")
+
+
+def token_stream(lexer, source):
+	lexer.input(source)
+	tokens = []
+	while True:
+		token = lexer.token()
+		if token is None:
+			return tokens
+		tokens.append((token.type, token.value, token.lineno, token.lexpos))
+
+
+def ply_lexer():
+	return make_lexer("ply")
+
+
+def bench_scanner():
+	print("scanner: tokenizing and parsing with PLY's lexer vs scanner.py")
+	sources = [source for _, source in PROGRAMS] + [FIB, TEMPLATED, GRADE, HELPERS]
+	for source in sources:
+		if token_stream(ply_lexer(), source) != token_stream(Scanner(), source):
+			raise AssertionError("scanner tokens differ from PLY's on:\n" + source)
+	large = "\n".join(sources) * 50
+	for label, new_lexer in [("ply", ply_lexer), ("scanner", Scanner)]:
+		start = time.perf_counter()
+		token_stream(new_lexer(), large)
+		tokenize = time.perf_counter() - start
+		start = time.perf_counter()
+		parse_program(large, label)
+		parse = time.perf_counter() - start
+		print(f"  {label:<8} tokenize {tokenize * 1000:8.2f} ms   parse {parse * 1000:8.2f} ms   ({len(large)} chars)")
+
+
+def same_tree(a, b):
+	if isinstance(a, Element):
+		if type(a) is not type(b) or a.elem_type != b.elem_type:
+			return False
+		a_items, b_items = list(a.items()), list(b.items())
+		return len(a_items) == len(b_items) and all(a_key == b_key and same_tree(a_value, b_value) for (a_key, a_value), (b_key, b_value) in zip(a_items, b_items))
+	if isinstance(a, list):
+		return isinstance(b, list) and len(a) == len(b) and all(map(same_tree, a, b))
+	return type(a) is type(b) and a == b
+
+
+# Programs covering every rule in brewparse.py, and how each operator in its
+# precedence table nests with the others
+GRAMMAR = [
+	"func main() { x = 1; }",
+	"func main() { o = @; o.x = \"s\"; o.f = lambda(a, ref b) { b = a; return; }; o.f(1, y); return o.x; }",
+	"func f(ref a, b, c) { if (a) { return nil; } else { while (!b) { c = lambda() { return true; }; } } return f(a, b, false); } func main() { f(); }",
+	"func main() { print(1 - 2 - 3, 8 / 4 / 2, 1 + 2 * 3 - 4 / 5, -1 * -2, !a == !b, -(1 + 2) * 3); }",
+	"func main() { x = a || b && c || d && !e; y = a < b == c >= d != e <= f > g; z = 1 + 2 < 3 * 4 && 5 - 6 >= 7 / 8 || x; }",
+	"func main() { x = ((a)); x = - - !-a; x = o.m(o.x, (f(g(1), h())), -o.y) + 2; }",
+]
+
+# Each should fail at the same token with both parsers
+GRAMMAR_ERRORS = [
+	"",
+	"func main() { }",
+	"func main() { x = 1 }",
+	"func main() { (x) = 1; }",
+	"func main() { x.y.z = 1; }",
+	"func main() { f(1,); }",
+	"func main() { x = (1 + 2; }",
+	"func main() { return 1 2; }",
+	"func main(1) { x = 1; }",
+	"func main() { if (x) { y; } else y; }",
+	"func main() { x = 1 ! 2; }",
+]
+
+
+def parse_output(source, parser):
+	output = io.StringIO()
+	with contextlib.redirect_stdout(output):
+		try:
+			ast = parse_program(source, parser=parser)
+		except SyntaxError:
+			ast = None
+	return ast, output.getvalue()
+
+
+def bench_parser():
+	print("parser: yacc vs pratt.py")
+	sources = [source for _, source in PROGRAMS] + [FIB, TEMPLATED, GRADE, HELPERS]
+	for source in sources + GRAMMAR:
+		if not same_tree(parse_program(source), parse_program(source, parser="pratt")):
+			raise AssertionError("pratt tree differs from yacc's for:\n" + source)
+	for source in GRAMMAR_ERRORS:
+		yacc_ast, yacc_output = parse_output(source, "yacc")
+		pratt_ast, pratt_output = parse_output(source, "pratt")
+		if yacc_ast is not None or pratt_ast is not None or yacc_output != pratt_output:
+			raise AssertionError("pratt error differs from yacc's for:\n" + source)
+	large = "\n".join(sources) * 50
+	for lexer, parser in [("ply", "yacc"), ("ply", "pratt"), ("scanner", "pratt")]:
+		parse_time = best_time(lambda: parse_program(large, lexer, parser), 3)
+		print(f"  {parser:<6} {lexer:<8} {parse_time * 1000:8.2f} ms   ({len(large)} chars)")
+
+
+# Sources built around one huge comment or string, of about the given size
+LEXER_STRESS = {
+	"comment": lambda size: "func main() {\n/*" + "a comment line, with * and / in it\n" * (size // 36) + "*/ print(1);\n}",
+	"string": lambda size: "func main() { print(\"" + "a" * size + "\"); }",
+	"open comment": lambda size: "func main() { /*" + "/* x = 1; \n" * (size // 12),
+	"open string": lambda size: "func main() { print(\"" + "a" * size + "); }",
+}
+
+
+def bench_lexer_stress():
+	print("lexer stress: ns/char for a comment or string of 1, 2, 4 and 8 MB")
+	for name, make_source in LEXER_STRESS.items():
+		for label, new_lexer in [("ply", ply_lexer), ("scanner", Scanner)]:
+			results = []
+			for megabytes in [1, 2, 4, 8]:
+				source = make_source(megabytes * 1024 * 1024)
+				def tokenize():
+					with contextlib.redirect_stdout(io.StringIO()):
+						try:
+							return token_stream(new_lexer(), source)
+						except SyntaxError as e:
+							return str(e)
+				tokens = tokenize()
+				if name.startswith("open"):
+					if tokens != "Unterminated " + name[5:]:
+						raise AssertionError(f"{label} didn't report an unterminated {name[5:]}")
+				elif not isinstance(tokens, list) or len(tokens) != 11:
+					raise AssertionError(f"{label} mis-tokenized a {megabytes} MB {name}")
+				results.append(f"{best_time(tokenize, 3) / len(source) * 1e9:6.2f}")
+			print(f"  {name:<13} {label:<8} {' '.join(results)}")
+
+
+def bench_parse_threads():
+	print("parse threads: 8 threads parsing the benchmark programs 2000 times, checked against serial parses")
+	sources = [source for _, source in PROGRAMS] + [FIB, TEMPLATED, GRADE, HELPERS] + GRAMMAR
+	jobs = [sources[i % len(sources)] for i in range(2000)]
+	# Switch threads as often as possible, so that parses interleave
+	switch_interval = sys.getswitchinterval()
+	sys.setswitchinterval(1e-6)
+	try:
+		for lexer, parser in [("ply", "yacc"), ("scanner", "yacc"), ("ply", "pratt"), ("scanner", "pratt")]:
+			expected = {source: parse_program(source, lexer, parser) for source in sources}
+			expected_tokens = {source: token_stream(make_lexer(lexer), source) for source in sources}
+			def parse(source):
+				return parse_program(source, lexer, parser), token_stream(make_lexer(lexer), source)
+			start = time.perf_counter()
+			with ThreadPoolExecutor(8) as pool:
+				for source, (ast, tokens) in zip(jobs, pool.map(parse, jobs)):
+					if not same_tree(ast, expected[source]) or tokens != expected_tokens[source]:
+						raise AssertionError(f"{parser} with {lexer} parsed differently on a thread:\n" + source)
+			print(f"  {parser:<6} {lexer:<8} {(time.perf_counter() - start) * 1000:8.2f} ms")
+	finally:
+		sys.setswitchinterval(switch_interval)
+
+
+BENCHMARKS = {
+	"backends": bench_backends,
+	"calls": bench_calls,
+	"compile": bench_compile,
+	"batch": bench_batch,
+	"ast_cache": bench_ast_cache,
+	"startup": bench_startup,
+	"scanner": bench_scanner,
+	"lexer_stress": bench_lexer_stress,
+	"parser": bench_parser,
+	"parse_threads": bench_parse_threads,
+	"recursion": bench_recursion,
+	"optimize": bench_optimize,
+	"memoize": bench_memoize,
+	"tiers": bench_tiers,
+	"quicken": bench_quicken,
+	"infer": bench_infer,
+	"frames": bench_frames,
+	"deep": bench_deep,
+	"natives": bench_natives,
+	"short_circuit": bench_short_circuit,
+	"memory": bench_memory,
+	"allocations": bench_allocations,
+}
+
+
+def main():
+	names = sys.argv[1:] or list(BENCHMARKS)
+	for name in names:
+		BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+	main()
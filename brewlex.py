@@ -1,4 +1,4 @@
-from ply import lex
+import sys
 
 reserved = (
     "FUNC",
@@ -110,21 +110,44 @@ def t_newline(t):
     t.lexer.lineno += t.value.count("\n")
 
 
+# Only the opening /* is matched by the regex; the closing */ is found with
+# str.find, so a comment takes time linear in its length, and an unterminated
+# one is reported instead of being rescanned, and lexed as code, from each
+# /* inside it.
 def t_comment(t):
-    r"/\*(.|\n)*?\*/"
-    t.lexer.lineno += t.value.count("\n")
-
-
+    r"/\*"
+    data = t.lexer.lexdata
+    end = data.find("*/", t.lexpos + 2)
+    if end == -1:
+        unterminated("comment", t.lexer.lineno)
+    t.lexer.lineno += data.count("\n", t.lexpos, end)
+    t.lexer.lexpos = end + 2
+
+
+# A string ends at the next quote on the same line. The closing quote is
+# optional in the regex so that a string missing one is reported here
+# rather than as a stray '"'.
 def t_STRING(t):
-    r'".*?"'
+    r'"[^"\n]*"?'
+    if len(t.value) < 2 or t.value[-1] != '"':
+        unterminated("string", t.lexer.lineno)
     t.value = t.value[1:-1]
     return t
 
 
+def unterminated(construct, lineno):
+    print(f"Unterminated {construct} starting on line {lineno}")
+    raise SyntaxError(f"Unterminated {construct}")
+
+
 def t_error(t):
     print(f"Illegal character {t.value[0]}")
     t.lexer.skip(1)
 
 
-# Build the lexer
-lex.lex()
+# PLY is only imported, and the lexer built, the first time a program is
+# parsed (see brewparse.get_parser)
+def build_lexer():
+    from ply import lex
+
+    return lex.lex(module=sys.modules[__name__])
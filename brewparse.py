@@ -1,7 +1,9 @@
-from element import Element
+import copy
+import threading
+
+from element import Element, Func, Arg, Assign, If, While, Return, UnaryOp, BinOp, Literal, Nil, Var, Call
 from brewlex import *
 from intbase import InterpreterBase
-from ply import yacc
 
 # Parsing rules
 
@@ -38,9 +40,9 @@ def p_func(p):
     """func : FUNC NAME LPAREN formal_args RPAREN LBRACE statements RBRACE
     | FUNC NAME LPAREN RPAREN LBRACE statements RBRACE"""
     if len(p) == 9:  # handle with 1+ formal args
-        p[0] = Element(InterpreterBase.FUNC_DEF, name=p[2], args=p[4], statements=p[7])
+        p[0] = Func(InterpreterBase.FUNC_DEF, name=p[2], args=p[4], statements=p[7])
     else:  # handle no formal args
-        p[0] = Element(InterpreterBase.FUNC_DEF, name=p[2], args=[], statements=p[6])
+        p[0] = Func(InterpreterBase.FUNC_DEF, name=p[2], args=[], statements=p[6])
 
 
 def p_lambda(p):
@@ -60,12 +62,12 @@ def p_formal_args(p):
 
 def p_formal_arg(p):
     "formal_arg : NAME"
-    p[0] = Element(InterpreterBase.ARG_DEF, name=p[1])
+    p[0] = Arg(InterpreterBase.ARG_DEF, name=p[1])
 
 
 def p_formal_ref_arg(p):
     "formal_arg : REF NAME"
-    p[0] = Element(InterpreterBase.REFARG_DEF, name=p[2])
+    p[0] = Arg(InterpreterBase.REFARG_DEF, name=p[2])
 
 
 def p_statements(p):
@@ -76,7 +78,7 @@ def p_statements(p):
 
 def p_statement___assign(p):
     "statement : variable ASSIGN expression SEMI"
-    p[0] = Element("=", name=p[1], expression=p[3])
+    p[0] = Assign("=", name=p[1], expression=p[3])
 
 
 def p_variable(p):
@@ -93,14 +95,14 @@ def p_statement_if(p):
     | IF LPAREN expression RPAREN LBRACE statements RBRACE ELSE LBRACE statements RBRACE
     """
     if len(p) == 8:
-        p[0] = Element(
+        p[0] = If(
             InterpreterBase.IF_DEF,
             condition=p[3],
             statements=p[6],
             else_statements=None,
         )
     else:
-        p[0] = Element(
+        p[0] = If(
             InterpreterBase.IF_DEF,
             condition=p[3],
             statements=p[6],
@@ -110,7 +112,7 @@ def p_statement_if(p):
 
 def p_statement_while(p):
     "statement : WHILE LPAREN expression RPAREN LBRACE statements RBRACE"
-    p[0] = Element(InterpreterBase.WHILE_DEF, condition=p[3], statements=p[6])
+    p[0] = While(InterpreterBase.WHILE_DEF, condition=p[3], statements=p[6])
 
 
 def p_statement_expr(p):
@@ -125,17 +127,17 @@ def p_statement_return(p):
         expr = p[2]
     else:
         expr = None
-    p[0] = Element(InterpreterBase.RETURN_DEF, expression=expr)
+    p[0] = Return(InterpreterBase.RETURN_DEF, expression=expr)
 
 
 def p_expression_not(p):
     "expression : NOT expression"
-    p[0] = Element(InterpreterBase.NOT_DEF, op1=p[2])
+    p[0] = UnaryOp(InterpreterBase.NOT_DEF, op1=p[2])
 
 
 def p_expression_uminus(p):
     "expression : MINUS expression %prec UMINUS"
-    p[0] = Element(InterpreterBase.NEG_DEF, op1=p[2])
+    p[0] = UnaryOp(InterpreterBase.NEG_DEF, op1=p[2])
 
 
 def p_arith_expression_binop(p):
@@ -149,7 +151,7 @@ def p_arith_expression_binop(p):
     | expression MINUS expression
     | expression MULTIPLY expression
     | expression DIVIDE expression"""
-    p[0] = Element(p[2], op1=p[1], op2=p[3])
+    p[0] = BinOp(p[2], op1=p[1], op2=p[3])
 
 
 def p_expression_group(p):
@@ -160,12 +162,12 @@ def p_expression_group(p):
 def p_expression_and_or(p):
     """expression : expression OR expression
     | expression AND expression"""
-    p[0] = Element(p[2], op1=p[1], op2=p[3])
+    p[0] = BinOp(p[2], op1=p[1], op2=p[3])
 
 
 def p_expression_number(p):
     "expression : NUMBER"
-    p[0] = Element(InterpreterBase.INT_DEF, val=p[1])
+    p[0] = Literal(InterpreterBase.INT_DEF, val=p[1])
 
 
 def p_expression_lambda(p):
@@ -177,12 +179,12 @@ def p_expression_bool(p):
     """expression : TRUE
     | FALSE"""
     bool_val = p[1] == InterpreterBase.TRUE_DEF
-    p[0] = Element(InterpreterBase.BOOL_DEF, val=bool_val)
+    p[0] = Literal(InterpreterBase.BOOL_DEF, val=bool_val)
 
 
 def p_expression_nil(p):
     "expression : NIL"
-    p[0] = Element(InterpreterBase.NIL_DEF)
+    p[0] = Nil(InterpreterBase.NIL_DEF)
 
 
 def p_expression_obj(
@@ -194,21 +196,21 @@ def p_expression_obj(
 
 def p_expression_string(p):
     "expression : STRING"
-    p[0] = Element(InterpreterBase.STRING_DEF, val=p[1])
+    p[0] = Literal(InterpreterBase.STRING_DEF, val=p[1])
 
 
 def p_expression_variable(p):
     "expression : variable"
-    p[0] = Element(InterpreterBase.VAR_DEF, name=p[1])
+    p[0] = Var(InterpreterBase.VAR_DEF, name=p[1])
 
 
 def p_func_call(p):
     """expression : NAME LPAREN args RPAREN
     | NAME LPAREN RPAREN"""
     if len(p) == 5:
-        p[0] = Element(InterpreterBase.FCALL_DEF, name=p[1], args=p[3])
+        p[0] = Call(InterpreterBase.FCALL_DEF, name=p[1], args=p[3])
     else:
-        p[0] = Element(InterpreterBase.FCALL_DEF, name=p[1], args=[])
+        p[0] = Call(InterpreterBase.FCALL_DEF, name=p[1], args=[])
 
 
 def p_method_call(p):
@@ -233,13 +235,78 @@ def p_error(p):
         print("Syntax error at EOF")
 
 
-# exported function
-def parse_program(program):
-    ast = yacc.parse(program)
+# The parser is built the first time it's needed rather than at import time,
+# so importing the interpreter doesn't pay for PLY. When parsetab.py matches
+# the grammar its tables are loaded as they are; only a changed grammar
+# regenerates it, and parser.out is never written. The PLY lexer is built the
+# same way, the first time it's used.
+#
+# Neither is used to parse directly: PLY keeps the state of a parse on the
+# parser and lexer objects, so every parse gets a copy of its own (see
+# make_parser and make_lexer), sharing the tables, and programs can be parsed
+# from several threads at once.
+parser = None
+lexer = None
+build_lock = threading.Lock()
+
+
+def get_parser():
+    global parser
+    if parser is None:
+        with build_lock:
+            if parser is None:
+                from ply import yacc
+
+                parser = yacc.yacc(debug=False)
+    return parser
+
+
+def get_lexer():
+    global lexer
+    if lexer is None:
+        with build_lock:
+            if lexer is None:
+                lexer = build_lexer()
+    return lexer
+
+
+# exported function. lexer is "ply" for the lexer PLY builds from brewlex.py,
+# or "scanner" for the hand-written one in scanner.py, which produces the same
+# tokens faster. parser is "yacc" for the LALR parser built from the rules
+# above, or "pratt" for the hand-written one in pratt.py, which builds the same
+# trees without a reduction per rule.
+def parse_program(program, lexer="ply", parser="yacc"):
+    if parser == "pratt":
+        from pratt import ParseError, parse
+
+        tokens = make_lexer(lexer)
+        tokens.input(program)
+        try:
+            return parse(tokens)
+        except ParseError as e:
+            p_error(e.token)
+            raise SyntaxError("Syntax error") from None
+        except RecursionError:
+            # Nested too deeply for its recursive descent, which the LALR
+            # parser can handle
+            pass
+    ast = make_parser().parse(program, lexer=make_lexer(lexer))
     if ast is None:
         raise SyntaxError("Syntax error")
     return ast
 
 
-# generate our parser
-yacc.yacc()
+# A yacc parser for one parse. Its parse tables are shared, and never written.
+def make_parser():
+    return copy.copy(get_parser())
+
+
+# A lexer for one parse, counting lines from 1
+def make_lexer(lexer):
+    if lexer == "scanner":
+        from scanner import Scanner
+
+        return Scanner()
+    lexer = get_lexer().clone()
+    lexer.lineno = 1
+    return lexer
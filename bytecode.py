@@ -0,0 +1,439 @@
+from element import Call
+from intbase import InterpreterBase
+from intbase import ErrorType
+from operations import unary_operations
+from operations import binary_operations
+from operations import short_circuit_results, check_logical_operand
+from value import int_value, string_value, NIL
+
+
+# Bytecode backend. compile_program lowers every function's Element tree into a
+# flat instruction stream of (opcode, argument) integer pairs with its own
+# constant pool, and execute runs it in a single dispatch loop. Variables are
+# addressed by the slots from resolver.py.
+# Brewin calls go on an explicit call stack instead of recursing in Python.
+
+# Opcodes
+LOAD_CONST = 0  # push consts[arg]
+LOAD_VAR = 1  # push the variable in slot arg
+STORE_VAR = 2  # pop into the variable in slot arg
+STORE_PARAM = 3  # pop into slot arg in the innermost frame, without a scope search
+UNARY_OP = 4  # apply unary_table[arg] to the top of the stack
+BINARY_OP = 5  # apply binary_table[arg] to the top two values
+JUMP = 6  # continue at instruction offset arg
+POP_JUMP_IF_FALSE = 7  # pop a value, jump to arg if its val() is falsy
+CHECK_CONDITION = 8  # type-check the condition on top of the stack; arg 0 = if, 1 = while
+PUSH_FRAME = 9
+POP_FRAME = 10
+POP_TOP = 11
+CALL_BEGIN = 12  # count the call and push the callee's frame; arg indexes the function table
+CALL_ENTER = 13  # arguments are bound, transfer control to functions[arg]
+RETURN_VALUE = 14
+RETURN_NIL = 15
+PRINT = 16  # pop arg values and print them
+INPUTI = 17  # arg is 1 if a prompt value is on the stack
+INPUTS = 18
+RAISE = 19  # consts[arg] is an (ErrorType, message) pair
+HALT = 20
+TAIL_CALL = 21  # arguments are bound in a new frame on top of the caller's, continue in functions[arg] without a new call record
+CHECK_LOGICAL = 22  # type-check the operand on top of the stack for binary_names[arg] (&& or ||)
+JUMP_IF_FALSE_OR_POP = 23  # jump to arg if the top of the stack is false, otherwise pop it
+JUMP_IF_TRUE_OR_POP = 24  # jump to arg if the top of the stack is true, otherwise pop it
+CALL_NATIVE = 25  # pop the arguments of natives[arg] and push what it returns
+
+opcode_names = {value: name for name, value in globals().items() if name.isupper() and isinstance(value, int)}
+
+unary_table = list(unary_operations.values())
+unary_index = {op: i for i, op in enumerate(unary_operations)}
+binary_table = list(binary_operations.values())
+binary_index = {op: i for i, op in enumerate(binary_operations)}
+binary_names = list(binary_operations)
+
+literal_types = {InterpreterBase.INT_DEF, InterpreterBase.STRING_DEF, InterpreterBase.BOOL_DEF, InterpreterBase.NIL_DEF}
+assignable_types = literal_types | set(unary_operations) | set(binary_operations) | {InterpreterBase.FCALL_DEF, InterpreterBase.VAR_DEF}
+condition_kinds = ["if", "while"]
+builtin_names = {"inputi", "inputs", "print"}
+
+
+class Code:
+	def __init__(self, name, params):
+		self.name = name
+		self.params = params
+		self.code = []
+		self.consts = []
+		self.const_index = {}
+
+	def emit(self, opcode, arg=0):
+		self.code.append(opcode)
+		self.code.append(arg)
+		return len(self.code) - 2
+
+	def patch(self, offset, target):
+		self.code[offset + 1] = target
+
+	def offset(self):
+		return len(self.code)
+
+	def add_const(self, value, key):
+		if key not in self.const_index:
+			self.const_index[key] = len(self.consts)
+			self.consts.append(value)
+		return self.const_index[key]
+
+	def disassemble(self):
+		lines = []
+		for offset in range(0, len(self.code), 2):
+			lines.append("{:4} {:<18} {}".format(offset, opcode_names[self.code[offset]], self.code[offset + 1]))
+		return "\n".join(lines)
+
+
+class Bytecode:
+	# short_circuit compiles && and || to evaluate their right operand only when needed
+	def __init__(self, functions, short_circuit=False, natives={}):
+		self.short_circuit = short_circuit
+		self.natives = list(natives.values())
+		self.native_index = {key: i for i, key in enumerate(natives)}
+		self.function_nodes = functions
+		self.keys = list(functions)
+		self.index = {key: i for i, key in enumerate(self.keys)}
+		self.functions = [None] * len(self.keys)
+		for i, key in enumerate(self.keys):
+			function_node = functions[key]
+			self.functions[i] = FunctionCompiler(self, function_node).compile()
+		self.entry = self.compile_entry()
+
+	# A stub that calls main() the same way a Brewin call site would, then halts
+	def compile_entry(self):
+		code = Code("<entry>", [])
+		compiler = FunctionCompiler(self, None, code)
+		compiler.run((compiler.compile_call, Call(InterpreterBase.FCALL_DEF, "main", [])))
+		code.emit(HALT)
+		code.code = tuple(code.code)
+		return code
+
+
+# Compiling is driven by an explicit work stack instead of recursion, so
+# arbitrarily deep expressions and nested blocks compile without running out
+# of Python stack. Each step is a (method, argument) pair; a method emits what
+# it can right away and schedules the steps that have to follow it. Jumps
+# waiting for their target are kept on a stack of their own, since blocks and
+# operators always finish in the reverse order they started.
+class FunctionCompiler:
+	def __init__(self, program, function_node, code=None):
+		self.program = program
+		self.function_node = function_node
+		self.code = code
+		self.work = []
+		self.jumps = []
+
+	def compile(self):
+		params = [arg.slot for arg in self.function_node.get("args")]
+		self.code = Code(self.function_node.get("name"), params)
+		self.run(*self.statement_steps(self.function_node.get("statements")))
+		self.code.emit(RETURN_NIL)
+		self.code.code = tuple(self.code.code)
+		return self.code
+
+	def run(self, *steps):
+		work = self.work
+		self.schedule(*steps)
+		while work:
+			method, arg = work.pop()
+			method(arg)
+
+	# Makes steps the next ones to run, in order
+	def schedule(self, *steps):
+		self.work.extend(reversed(steps))
+
+	def emit(self, instruction):
+		self.code.emit(*instruction)
+
+	# Targets the innermost pending jump at the current offset
+	def patch_jump(self, _):
+		self.code.patch(self.jumps.pop(), self.code.offset())
+
+	def statement_steps(self, statement_nodes):
+		return [(self.compile_statement, statement_node) for statement_node in statement_nodes]
+
+	def compile_statement(self, statement_node):
+		match statement_node.elem_type:
+			case "=":
+				self.compile_assignment(statement_node)
+			case InterpreterBase.FCALL_DEF:
+				self.schedule((self.compile_expression, statement_node), (self.emit, (POP_TOP,)))
+			case InterpreterBase.RETURN_DEF:
+				expression_node = statement_node.get("expression")
+				if expression_node is None:
+					self.code.emit(RETURN_NIL)
+				elif expression_node.elem_type == InterpreterBase.FCALL_DEF and self.is_user_call(expression_node):
+					# Becomes TAIL_CALL, which never comes back here
+					self.compile_user_call(expression_node, tail=True)
+				else:
+					self.schedule((self.compile_expression, expression_node), (self.emit, (RETURN_VALUE,)))
+			case InterpreterBase.IF_DEF:
+				self.compile_if(statement_node)
+			case InterpreterBase.WHILE_DEF:
+				self.compile_while(statement_node)
+		# Any other expression statement is never evaluated
+
+	def compile_assignment(self, statement_node):
+		expression_node = statement_node.get("expression")
+		if expression_node.elem_type not in assignable_types:
+			self.compile_error(ErrorType.TYPE_ERROR, f"Invalid assignment: {expression_node.elem_type}")
+			return
+		self.schedule((self.compile_expression, expression_node), (self.emit, (STORE_VAR, statement_node.slot)))
+
+	def compile_if(self, if_node):
+		steps = [(self.compile_expression, if_node.get("condition")), (self.if_jump, None)]
+		steps += self.block_steps(if_node.get("statements"), if_node.scoped)
+		if if_node.get("else_statements") is not None:
+			steps.append((self.else_jump, None))
+			steps += self.block_steps(if_node.get("else_statements"), if_node.else_scoped)
+		steps.append((self.patch_jump, None))
+		self.schedule(*steps)
+
+	def if_jump(self, _):
+		self.code.emit(CHECK_CONDITION, 0)
+		self.jumps.append(self.code.emit(POP_JUMP_IF_FALSE))
+
+	# Ends the then block with a jump past the else block, which starts here
+	def else_jump(self, _):
+		jump_to_else = self.jumps.pop()
+		self.jumps.append(self.code.emit(JUMP))
+		self.code.patch(jump_to_else, self.code.offset())
+
+	def block_steps(self, statement_nodes, scoped):
+		steps = self.statement_steps(statement_nodes)
+		if scoped:
+			steps = [(self.emit, (PUSH_FRAME,))] + steps + [(self.emit, (POP_FRAME,))]
+		return steps
+
+	# Like the tree-walker, the condition is only type checked on entry, and is
+	# re-evaluated inside the loop's frame
+	def compile_while(self, while_node):
+		condition = while_node.get("condition")
+		self.schedule((self.compile_expression, condition), (self.loop_head, while_node),
+			*self.statement_steps(while_node.get("statements")),
+			(self.compile_expression, condition), (self.loop_end, while_node))
+
+	def loop_head(self, while_node):
+		code = self.code
+		code.emit(CHECK_CONDITION, 1)
+		if while_node.scoped:
+			code.emit(PUSH_FRAME)
+		self.jumps.append(code.offset())
+		self.jumps.append(code.emit(POP_JUMP_IF_FALSE))
+
+	def loop_end(self, while_node):
+		code = self.code
+		exit_jump = self.jumps.pop()
+		code.emit(JUMP, self.jumps.pop())
+		code.patch(exit_jump, code.offset())
+		if while_node.scoped:
+			code.emit(POP_FRAME)
+
+	def compile_expression(self, expression_node):
+		code = self.code
+		elem_type = expression_node.elem_type
+		if elem_type == InterpreterBase.FCALL_DEF:
+			self.compile_call(expression_node)
+		elif elem_type == InterpreterBase.VAR_DEF:
+			code.emit(LOAD_VAR, expression_node.slot)
+		elif elem_type in literal_types:
+			val = expression_node.get("val")
+			code.emit(LOAD_CONST, code.add_const(expression_node.value, (elem_type, type(val), val)))
+		elif elem_type in unary_operations:
+			self.schedule((self.compile_expression, expression_node.get("op1")), (self.emit, (UNARY_OP, unary_index[elem_type])))
+		elif self.program.short_circuit and elem_type in short_circuit_results:
+			self.schedule((self.compile_expression, expression_node.get("op1")), (self.logical_jump, elem_type),
+				(self.compile_expression, expression_node.get("op2")), (self.emit, (CHECK_LOGICAL, binary_index[elem_type])),
+				(self.patch_jump, None))
+		elif elem_type in binary_operations:
+			self.schedule((self.compile_expression, expression_node.get("op1")), (self.compile_expression, expression_node.get("op2")),
+				(self.emit, (BINARY_OP, binary_index[elem_type])))
+		else:
+			self.compile_error(ErrorType.TYPE_ERROR, "Unknown expression type: {}".format(elem_type))
+
+	# Checks the left operand of && or ||, and skips the right one if it decides the result
+	def logical_jump(self, op):
+		self.code.emit(CHECK_LOGICAL, binary_index[op])
+		self.jumps.append(self.code.emit(JUMP_IF_TRUE_OR_POP if short_circuit_results[op] else JUMP_IF_FALSE_OR_POP))
+
+	def is_user_call(self, call_node):
+		f_name = call_node.get("name")
+		key = "{}-{}".format(f_name, len(call_node.get("args")))
+		return f_name not in builtin_names and key not in self.program.native_index and key in self.program.index
+
+	def compile_call(self, call_node):
+		f_name = call_node.get("name")
+		arg_nodes = call_node.get("args")
+		arg_steps = [(self.compile_expression, arg_node) for arg_node in arg_nodes]
+		if f_name == "inputi" or f_name == "inputs":
+			if len(arg_nodes) > 1:
+				self.compile_error(ErrorType.NAME_ERROR, f"No {f_name}() function found that takes > 1 parameter")
+				return
+			self.schedule(*arg_steps, (self.emit, (INPUTI if f_name == "inputi" else INPUTS, len(arg_nodes))))
+			return
+
+		if f_name == "print":
+			self.schedule(*arg_steps, (self.emit, (PRINT, len(arg_nodes))))
+			return
+
+		key = "{}-{}".format(f_name, len(arg_nodes))
+		if key in self.program.native_index:
+			# Arguments are evaluated in the caller's scope, as for print
+			self.schedule(*arg_steps, (self.emit, (CALL_NATIVE, self.program.native_index[key])))
+			return
+		if key not in self.program.index:
+			self.compile_error(ErrorType.NAME_ERROR, "Unknown Function Referenced: {}, taking {} args".format(f_name, len(arg_nodes)))
+			return
+		self.compile_user_call(call_node, tail=False)
+
+	def compile_user_call(self, call_node, tail):
+		arg_nodes = call_node.get("args")
+		key = "{}-{}".format(call_node.get("name"), len(arg_nodes))
+		function_index = self.program.index[key]
+		function_node = self.program.function_nodes[key]
+		self.code.emit(PUSH_FRAME if tail else CALL_BEGIN, function_index)
+		# Arguments are evaluated with the callee's frame already pushed, as in run_function
+		steps = []
+		for arg, arg_node in zip(function_node.get("args"), arg_nodes):
+			steps.append((self.compile_expression, arg_node))
+			steps.append((self.emit, (STORE_PARAM, arg.slot)))
+		steps.append((self.emit, (TAIL_CALL if tail else CALL_ENTER, function_index)))
+		self.schedule(*steps)
+
+	def compile_error(self, error_type, message):
+		self.code.emit(RAISE, self.code.add_const((error_type, message), ("error", error_type, message)))
+
+
+def compile_program(functions, variable_names, short_circuit=False, natives={}):
+	program = Bytecode(functions, short_circuit, natives)
+	program.variable_names = variable_names
+	return program
+
+
+def execute(interp, program):
+	env = interp.env
+	frames = env.frames
+	bindings = env.bindings
+	variable_names = program.variable_names
+	max_call_depth = interp.max_call_depth
+	functions = program.functions
+	natives = program.natives
+	current = program.entry
+	code = current.code
+	consts = current.consts
+	pc = 0
+	stack = []
+	calls = []
+
+	while True:
+		opcode = code[pc]
+		arg = code[pc + 1]
+		pc += 2
+
+		if opcode == LOAD_VAR:
+			binding = bindings[arg]
+			if not binding:
+				interp.error(ErrorType.NAME_ERROR, f"Unknown variable: {variable_names[arg]}")
+			stack.append(binding[-1])
+		elif opcode == LOAD_CONST:
+			stack.append(consts[arg])
+		elif opcode == BINARY_OP:
+			right = stack.pop()
+			stack[-1] = binary_table[arg](interp, stack[-1], right)
+		elif opcode == STORE_VAR:
+			binding = bindings[arg]
+			if binding:
+				binding[-1] = stack.pop()
+			else:
+				binding.append(stack.pop())
+				frames[-1].append(arg)
+		elif opcode == POP_JUMP_IF_FALSE:
+			if not stack.pop().val():
+				pc = arg
+		elif opcode == JUMP:
+			pc = arg
+		elif opcode == UNARY_OP:
+			stack[-1] = unary_table[arg](interp, stack[-1])
+		elif opcode == CHECK_CONDITION:
+			condition = stack[-1]
+			if condition.elem_type != InterpreterBase.BOOL_DEF:
+				interp.error(ErrorType.TYPE_ERROR, "Type mismatch on {} condition: {}".format(condition_kinds[arg], condition.elem_type))
+		elif opcode == CHECK_LOGICAL:
+			check_logical_operand(interp, binary_names[arg], stack[-1])
+		elif opcode == JUMP_IF_FALSE_OR_POP:
+			if stack[-1].val():
+				stack.pop()
+			else:
+				pc = arg
+		elif opcode == JUMP_IF_TRUE_OR_POP:
+			if stack[-1].val():
+				pc = arg
+			else:
+				stack.pop()
+		elif opcode == PUSH_FRAME:
+			frames.append([])
+		elif opcode == POP_FRAME:
+			for slot in frames.pop():
+				bindings[slot].pop()
+		elif opcode == CALL_BEGIN:
+			interp.recursion_depth += 1
+			if interp.recursion_depth > max_call_depth:
+				interp.error(ErrorType.FAULT_ERROR, "Recursion depth exceeded")
+			frames.append([])
+		elif opcode == STORE_PARAM:
+			env.bind(arg, stack.pop())
+		elif opcode == CALL_ENTER:
+			calls.append((current, pc, len(frames) - 1))
+			current = functions[arg]
+			code = current.code
+			consts = current.consts
+			pc = 0
+		elif opcode == TAIL_CALL:
+			# The frames of the function making the call stay below the callee's,
+			# since scoping is dynamic; the return at the end of the chain drops them
+			current = functions[arg]
+			code = current.code
+			consts = current.consts
+			pc = 0
+		elif opcode == RETURN_VALUE or opcode == RETURN_NIL:
+			ret = stack.pop() if opcode == RETURN_VALUE else NIL
+			current, pc, base = calls.pop()
+			# Drops the callee's frame along with any if/while frames still open in it
+			env.pop_frames_to(base)
+			interp.recursion_depth -= 1
+			code = current.code
+			consts = current.consts
+			stack.append(ret)
+		elif opcode == POP_TOP:
+			stack.pop()
+		elif opcode == PRINT:
+			if arg:
+				args = stack[-arg:]
+				del stack[-arg:]
+			else:
+				args = []
+			stack.append(interp.print_values(args))
+		elif opcode == CALL_NATIVE:
+			native = natives[arg]
+			if native.arity:
+				args = stack[-native.arity:]
+				del stack[-native.arity:]
+			else:
+				args = []
+			stack.append(native.handler(interp, args))
+		elif opcode == INPUTI:
+			if arg:
+				interp.output(stack.pop().val())
+			stack.append(int_value(int(interp.get_input())))
+		elif opcode == INPUTS:
+			if arg:
+				interp.output(stack.pop().val())
+			stack.append(string_value(str(interp.get_input())))
+		elif opcode == RAISE:
+			error_type, message = consts[arg]
+			interp.error(error_type, message)
+		elif opcode == HALT:
+			return stack.pop()
@@ -0,0 +1,298 @@
+from intbase import InterpreterBase
+from intbase import ErrorType
+from operations import unary_operations
+from operations import binary_operations
+from operations import short_circuit_results, check_logical_operand
+from value import int_value, string_value, NIL
+from natives import NativeFunction
+
+
+# Closure-compilation backend. Each function's Element tree is walked once and
+# every statement and expression is turned into a Python closure taking the
+# interpreter, with its operator handler, child closures and names pre-bound.
+# Running the program then does no dispatch on elem_type strings.
+#
+# Statement closures return None to keep going, or the Value being returned.
+# `return f(...)` to a user function returns f's CallSite instead, and the
+# calling function's loop runs it as a tail call (see call_function).
+# Literals evaluate to the Value the resolver pre-built on their node.
+
+literal_types = {InterpreterBase.INT_DEF, InterpreterBase.STRING_DEF, InterpreterBase.BOOL_DEF, InterpreterBase.NIL_DEF}
+assignable_types = literal_types | set(unary_operations) | set(binary_operations) | {InterpreterBase.FCALL_DEF, InterpreterBase.VAR_DEF}
+builtin_names = {"inputi", "inputs", "print"}
+
+
+# A call to a user function, with its arguments compiled
+class CallSite:
+	def __init__(self, f_name, args):
+		self.name = f_name
+		self.key = "{}-{}".format(f_name, len(args))
+		self.args = args
+
+
+class CompiledFunction:
+	def __init__(self, function_node):
+		self.name = function_node.get("name")
+		self.params = [arg.slot for arg in function_node.get("args")]
+		self.statements = compile_statements(function_node.get("statements"))
+
+
+# Natives go in the same table, in place of any function with the same key
+def compile_functions(functions, natives):
+	compiled = {key: CompiledFunction(function_node) for key, function_node in functions.items()}
+	compiled.update(natives)
+	return compiled
+
+
+def run_main(interp):
+	return compile_call("main", [])(interp)
+
+
+def compile_statements(statement_nodes):
+	if statement_nodes is None:
+		return None
+	statements = [compile_statement(statement_node) for statement_node in statement_nodes]
+	return tuple(statement for statement in statements if statement is not None)
+
+
+def compile_statement(statement_node):
+	match statement_node.elem_type:
+		case "=":
+			return compile_assignment(statement_node)
+		case InterpreterBase.FCALL_DEF:
+			call = compile_expression(statement_node)
+			def call_statement(interp):
+				call(interp)
+			return call_statement
+		case InterpreterBase.RETURN_DEF:
+			return compile_return(statement_node)
+		case InterpreterBase.IF_DEF:
+			return compile_if(statement_node)
+		case InterpreterBase.WHILE_DEF:
+			return compile_while(statement_node)
+	# Any other expression statement is never evaluated
+	return None
+
+
+def compile_assignment(statement_node):
+	expression_node = statement_node.get("expression")
+
+	if expression_node.elem_type not in assignable_types:
+		def invalid_assignment(interp):
+			interp.error(ErrorType.TYPE_ERROR, f"Invalid assignment: {expression_node.elem_type}")
+		return invalid_assignment
+
+	expression = compile_expression(expression_node)
+	slot = statement_node.slot
+	def assign(interp):
+		interp.env.set(slot, expression(interp))
+	return assign
+
+
+def compile_return(statement_node):
+	if statement_node.get("expression") is None:
+		def return_nil(interp):
+			return NIL
+		return return_nil
+
+	expression_node = statement_node.get("expression")
+	if expression_node.elem_type == InterpreterBase.FCALL_DEF and expression_node.get("name") not in builtin_names:
+		site = CallSite(expression_node.get("name"), [compile_expression(arg_node) for arg_node in expression_node.get("args")])
+		def tail_call(interp):
+			return site
+		return tail_call
+
+	expression = compile_expression(expression_node)
+	def return_value(interp):
+		return expression(interp)
+	return return_value
+
+
+def compile_if(if_node):
+	condition = compile_expression(if_node.get("condition"))
+	statements = compile_statements(if_node.get("statements"))
+	else_statements = compile_statements(if_node.get("else_statements"))
+	scoped = if_node.scoped
+	else_scoped = if_node.else_scoped
+
+	def run_if(interp):
+		value = condition(interp)
+		if value.elem_type != InterpreterBase.BOOL_DEF:
+			interp.error(ErrorType.TYPE_ERROR, "Type mismatch on if condition: {}".format(value.elem_type))
+		if value.val():
+			return run_block(interp, statements, scoped)
+		if else_statements is not None:
+			return run_block(interp, else_statements, else_scoped)
+	return run_if
+
+
+def run_block(interp, statements, scoped):
+	if scoped:
+		interp.env.push_frame()
+	for statement in statements:
+		ret = statement(interp)
+		if ret is not None:
+			return ret
+	if scoped:
+		interp.env.pop_frame()
+
+
+def compile_while(while_node):
+	condition = compile_expression(while_node.get("condition"))
+	statements = compile_statements(while_node.get("statements"))
+	scoped = while_node.scoped
+
+	def run_while(interp):
+		value = condition(interp)
+		if value.elem_type != InterpreterBase.BOOL_DEF:
+			interp.error(ErrorType.TYPE_ERROR, "Type mismatch on while condition: {}".format(value.elem_type))
+		env = interp.env
+		if scoped:
+			env.push_frame()
+		# Like the tree-walker, only the first evaluation of the condition is type checked
+		while value.val():
+			for statement in statements:
+				ret = statement(interp)
+				if ret is not None:
+					return ret
+			value = condition(interp)
+		if scoped:
+			env.pop_frame()
+	return run_while
+
+
+def compile_expression(expression_node):
+	elem_type = expression_node.elem_type
+	if elem_type == InterpreterBase.FCALL_DEF:
+		return compile_call(expression_node.get("name"), expression_node.get("args"))
+
+	if elem_type == InterpreterBase.VAR_DEF:
+		var_name = expression_node.get("name")
+		slot = expression_node.slot
+		def get_variable(interp):
+			stack = interp.env.bindings[slot]
+			if not stack:
+				interp.error(ErrorType.NAME_ERROR, f"Unknown variable: {var_name}")
+			return stack[-1]
+		return get_variable
+
+	if elem_type in literal_types:
+		value = expression_node.value
+		def literal(interp):
+			return value
+		return literal
+
+	if (elem_type in unary_operations or elem_type in binary_operations) and expression_node.deep:
+		# Too deep for nested closures, so it runs on the tree-walker's explicit stack
+		def deep(interp):
+			return interp.evaluate_deep(expression_node)
+		return deep
+
+	if elem_type in unary_operations:
+		operation = unary_operations[elem_type]
+		operand = compile_expression(expression_node.get("op1"))
+		def unary(interp):
+			return operation(interp, operand(interp))
+		return unary
+
+	if elem_type in binary_operations:
+		operation = binary_operations[elem_type]
+		left = compile_expression(expression_node.get("op1"))
+		right = compile_expression(expression_node.get("op2"))
+		if elem_type in short_circuit_results:
+			return compile_logical(elem_type, operation, left, right)
+		def binary(interp):
+			return operation(interp, left(interp), right(interp))
+		return binary
+
+	def unknown_expression(interp):
+		interp.error(ErrorType.TYPE_ERROR, "Unknown expression type: {}".format(elem_type))
+	return unknown_expression
+
+
+# && and || check interp.short_circuit when they run, so the compiled functions
+# don't depend on it
+def compile_logical(op, operation, left, right):
+	decided = short_circuit_results[op]
+	def logical(interp):
+		if not interp.short_circuit:
+			return operation(interp, left(interp), right(interp))
+		op1 = check_logical_operand(interp, op, left(interp))
+		if op1.val() == decided:
+			return op1
+		return check_logical_operand(interp, op, right(interp))
+	return logical
+
+
+def compile_call(f_name, arg_nodes):
+	args = [compile_expression(arg_node) for arg_node in arg_nodes]
+
+	if f_name == "inputi" or f_name == "inputs":
+		if len(args) > 1:
+			def too_many_args(interp):
+				interp.error(ErrorType.NAME_ERROR, f"No {f_name}() function found that takes > 1 parameter")
+			return too_many_args
+		if f_name == "inputi":
+			def inputi(interp):
+				if args:
+					interp.output(args[0](interp).val())
+				return int_value(int(interp.get_input()))
+			return inputi
+		def inputs(interp):
+			if args:
+				interp.output(args[0](interp).val())
+			return string_value(str(interp.get_input()))
+		return inputs
+
+	if f_name == "print":
+		def print_call(interp):
+			return interp.print_values([arg(interp) for arg in args])
+		return print_call
+
+	site = CallSite(f_name, args)
+	def call(interp):
+		function = interp.closure_functions.get(site.key)
+		if type(function) is NativeFunction:
+			return function.handler(interp, [arg(interp) for arg in args])
+		return call_function(interp, site)
+	return call
+
+
+def lookup_function(interp, site):
+	function = interp.closure_functions.get(site.key)
+	if function is None:
+		interp.get_function(site.name, len(site.args))
+	return function
+
+
+def call_function(interp, site):
+	function = lookup_function(interp, site)
+	interp.recursion_depth += 1
+	if interp.recursion_depth > interp.max_call_depth:
+		interp.error(ErrorType.FAULT_ERROR, "Recursion depth exceeded")
+
+	env = interp.env
+	base = env.depth()
+	while True:
+		env.push_frame()
+		# Arguments are evaluated with the callee's frame already pushed, as in run_function
+		for param, arg in zip(function.params, site.args):
+			env.bind(param, arg(interp))
+		for statement in function.statements:
+			ret = statement(interp)
+			if ret is not None:
+				break
+		else:
+			ret = NIL
+		if type(ret) is not CallSite:
+			break
+		# A tail call: the caller's frames stay visible to the callee, as in run_user_function
+		site = ret
+		function = lookup_function(interp, site)
+		if type(function) is NativeFunction:
+			ret = function.handler(interp, [arg(interp) for arg in site.args])
+			break
+
+	env.pop_frames_to(base)
+	interp.recursion_depth -= 1
+	return ret
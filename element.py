@@ -1,4 +1,6 @@
 class Element:
+    __slots__ = ("elem_type", "dict")
+
     def __init__(self, elem_type, **kwargs):
         self.elem_type = elem_type
         self.dict = {}
@@ -10,9 +12,13 @@ class Element:
             return None
         return self.dict[key]
 
+    # (field, value) pairs in the order they were given
+    def items(self):
+        return self.dict.items()
+
     def __str__(self):
         s = f"{self.elem_type}: "
-        for key, value in self.dict.items():
+        for key, value in self.items():
             s += key + ": " + self.__val(value) + ", "
         return s[0:-2]
 
@@ -27,3 +33,172 @@ class Element:
                 return "[" + s[0:-2] + "]"
             return "[" + s + "]"
         return str(v)
+
+
+# Typed nodes for the common node types. They keep their fields in slots
+# instead of a per-node dict, and get() still works on them, so code written
+# against Element doesn't need to know the difference. `fields` lists what
+# get() and str() expose, in the same order the parser used to pass them;
+# any other slots hold data the interpreter attaches at load time.
+class Node(Element):
+    __slots__ = ()
+    fields = ()
+
+    def get(self, key):
+        return getattr(self, key, None)
+
+    def items(self):
+        return [(field, getattr(self, field)) for field in self.fields]
+
+
+class Func(Node):
+    __slots__ = ("name", "args", "statements")
+    fields = ("name", "args", "statements")
+
+    def __init__(self, elem_type, name, args, statements):
+        self.elem_type = elem_type
+        self.name = name
+        self.args = args
+        self.statements = statements
+
+
+class Arg(Node):
+    __slots__ = ("name", "slot")
+    fields = ("name",)
+
+    def __init__(self, elem_type, name):
+        self.elem_type = elem_type
+        self.name = name
+
+
+class Assign(Node):
+    __slots__ = ("name", "expression", "slot")
+    fields = ("name", "expression")
+
+    def __init__(self, elem_type, name, expression):
+        self.elem_type = elem_type
+        self.name = name
+        self.expression = expression
+
+
+# condition_is_bool is set by infer.py when the condition's type check can be
+# skipped. scoped and else_scoped are set by resolve() when the branch assigns
+# variables directly, and so needs a frame of its own.
+class If(Node):
+    __slots__ = ("condition", "statements", "else_statements", "condition_is_bool", "scoped", "else_scoped")
+    fields = ("condition", "statements", "else_statements")
+
+    def __init__(self, elem_type, condition, statements, else_statements):
+        self.elem_type = elem_type
+        self.condition = condition
+        self.statements = statements
+        self.else_statements = else_statements
+        self.condition_is_bool = False
+        self.scoped = True
+        self.else_scoped = True
+
+
+class While(Node):
+    __slots__ = ("condition", "statements", "condition_is_bool", "scoped")
+    fields = ("condition", "statements")
+
+    def __init__(self, elem_type, condition, statements):
+        self.elem_type = elem_type
+        self.condition = condition
+        self.statements = statements
+        self.condition_is_bool = False
+        self.scoped = True
+
+
+class Return(Node):
+    __slots__ = ("expression",)
+    fields = ("expression",)
+
+    def __init__(self, elem_type, expression):
+        self.elem_type = elem_type
+        self.expression = expression
+
+
+# unchecked is set by infer.py to an implementation that skips the type checks.
+# deep is set by resolve() on operators nested too deeply to evaluate recursively.
+class UnaryOp(Node):
+    __slots__ = ("op1", "unchecked", "deep")
+    fields = ("op1",)
+
+    def __init__(self, elem_type, op1):
+        self.elem_type = elem_type
+        self.op1 = op1
+        self.unchecked = None
+        self.deep = False
+
+
+# quick, quick_type, hits, misses and deopts are the type feedback kept by
+# quicken.py, and unchecked and deep are as for UnaryOp
+class BinOp(Node):
+    __slots__ = ("op1", "op2", "quick", "quick_type", "hits", "misses", "deopts", "unchecked", "deep")
+    fields = ("op1", "op2")
+
+    def __init__(self, elem_type, op1, op2):
+        self.elem_type = elem_type
+        self.op1 = op1
+        self.op2 = op2
+        self.quick = None
+        self.quick_type = None
+        self.hits = 0
+        self.misses = 0
+        self.deopts = 0
+        self.unchecked = None
+        self.deep = False
+
+
+# value is the Value the interpreter builds for the literal at load time
+class Literal(Node):
+    __slots__ = ("val", "value")
+    fields = ("val",)
+
+    def __init__(self, elem_type, val=None):
+        self.elem_type = elem_type
+        self.val = val
+
+
+# nil has no fields of its own, but reads as a Literal whose val is None
+class Nil(Literal):
+    __slots__ = ()
+    fields = ()
+
+
+class Var(Node):
+    __slots__ = ("name", "slot")
+    fields = ("name",)
+
+    def __init__(self, elem_type, name):
+        self.elem_type = elem_type
+        self.name = name
+
+
+# call_epoch, call_handler and call_target are the call-site cache filled in by Interpreter.run_function
+class Call(Node):
+    __slots__ = ("name", "args", "call_epoch", "call_handler", "call_target")
+    fields = ("name", "args")
+
+    def __init__(self, elem_type, name, args):
+        self.elem_type = elem_type
+        self.name = name
+        self.args = args
+        self.call_epoch = None
+        self.call_handler = None
+        self.call_target = None
+
+
+# Yields node and every Element nested inside it, using an explicit stack so
+# that deeply nested trees don't hit Python's recursion limit
+def walk(node):
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        yield node
+        for key, value in node.items():
+            if isinstance(value, Element):
+                stack.append(value)
+            elif isinstance(value, list):
+                stack.extend(v for v in value if isinstance(v, Element))
@@ -0,0 +1,69 @@
+# Variable storage for a running program, indexed by the slots assigned in resolver.py.
+#
+# bindings[slot] is the stack of live values for that variable, innermost frame
+# last, and each frame records the slots it bound so they can be dropped when it
+# is popped. Looking a variable up is bindings[slot][-1], which is the value
+# from the innermost frame that defines it, exactly like scanning the frames
+# from the top.
+#
+# Popped frames are cleared and kept in a pool for the next push_frame to reuse.
+class Environment:
+	def __init__(self, slot_count):
+		self.bindings = [[] for _ in range(slot_count)]
+		self.frames = [[]]
+		self.pool = []
+
+	def push_frame(self):
+		self.frames.append(self.pool.pop() if self.pool else [])
+
+	def pop_frame(self):
+		bindings = self.bindings
+		frame = self.frames.pop()
+		for slot in frame:
+			bindings[slot].pop()
+		frame.clear()
+		self.pool.append(frame)
+
+	# Pops frames until only `depth` are left
+	def pop_frames_to(self, depth):
+		while len(self.frames) > depth:
+			self.pop_frame()
+
+	def depth(self):
+		return len(self.frames)
+
+	def get(self, slot):
+		stack = self.bindings[slot]
+		if stack:
+			return stack[-1]
+		return None
+
+	# Updates the innermost binding of slot, or binds it in the innermost frame if there is none
+	def set(self, slot, value):
+		stack = self.bindings[slot]
+		if stack:
+			stack[-1] = value
+		else:
+			stack.append(value)
+			self.frames[-1].append(slot)
+
+	# Binds slot in the innermost frame even if an outer frame already has it (used for arguments)
+	def bind(self, slot, value):
+		frame = self.frames[-1]
+		if slot in frame:
+			self.bindings[slot][-1] = value
+		else:
+			self.bindings[slot].append(value)
+			frame.append(slot)
+
+	# The frames as {slot: value} dicts, outermost first
+	def snapshot(self):
+		seen = [0] * len(self.bindings)
+		frames = []
+		for frame in self.frames:
+			values = {}
+			for slot in frame:
+				values[slot] = self.bindings[slot][seen[slot]]
+				seen[slot] += 1
+			frames.append(values)
+		return frames
@@ -0,0 +1,369 @@
+from element import walk, Call
+from intbase import InterpreterBase
+from intbase import ErrorType
+from operations import binary_operations
+from operations import type_mismatch_message, unsupported_type_message, not_comparable_message, unary_mismatch_message
+from quicken import quickened_operations
+from value import int_value, bool_value
+
+
+# Static type inference, run once after resolution (see
+# Interpreter(infer_types=True)). Each function is analyzed on its own, flow
+# sensitively: the types of its variables are tracked from assignment to use,
+# joined where branches meet and iterated to a fixpoint around while loops.
+# Parameters, and the results of calls to user functions, are unknown.
+#
+# Operators whose operand types are proven get node.unchecked, the same fast
+# path quicken.py uses, and if/while nodes whose condition is proven to be a
+# bool get node.condition_is_bool, so the tree-walker skips those checks.
+# Branches of if (true) / if (false) that can't run are skipped, and
+# expressions marked deep by resolver.py are taken to have unknown types.
+#
+# An operator or condition proven to always fail a type check only rejects the
+# program before it runs if it is certain to run: it is in main, or in a
+# function main calls unconditionally, before that function's first if or
+# while (and not in the right operand of a short-circuiting && or ||). The
+# error reported is the first of those in the order they would run, with the
+# message the check would fail with (operations.py's). Some of those messages
+# show the operands' values, so those errors are only reported up front for
+# literal operands. Everything else is left to the run.
+#
+# Scoping is dynamic, so a variable can also change when a function called in
+# between assigns to it. Every call forgets the variables the callee (or
+# anything it calls) might assign, and the callee's parameter names, which its
+# arguments are evaluated under.
+
+INT = InterpreterBase.INT_DEF
+STRING = InterpreterBase.STRING_DEF
+BOOL = InterpreterBase.BOOL_DEF
+NIL = InterpreterBase.NIL_DEF
+
+literal_types = {INT, STRING, BOOL, NIL}
+builtin_types = {"inputi": INT, "inputs": STRING, "print": NIL}
+int_operators = {"-", "*", "/"}
+comparison_operators = {"<", ">", "<=", ">="}
+logical_operators = {"&&", "||"}
+
+unchecked_unary = {
+	InterpreterBase.NOT_DEF: lambda interp, op: bool_value(not op.v),
+	InterpreterBase.NEG_DEF: lambda interp, op: int_value(-op.v),
+}
+
+
+# Marks the functions in `functions` (the table built by Interpreter.run) and
+# returns the type errors certain to happen when the program runs, as
+# (ErrorType, message) pairs: at most one, the first to happen
+def infer_types(functions, short_circuit=False):
+	inference = TypeInference(functions, find_callees(functions), short_circuit)
+	traces = {}
+	for key, function_node in functions.items():
+		traces[key] = inference.infer_function(function_node)
+	error = first_error(traces, "main-0", set())
+	return [error] if error is not None and error is not RECURSES else []
+
+
+# What first_error returns for a call to a function that's already running,
+# which repeats its way to the recursion limit, so nothing after it runs
+RECURSES = object()
+
+
+# The first error in a function's trace, or in the traces of the functions it
+# calls on the way
+def first_error(traces, key, running):
+	if key not in traces:
+		return None
+	if key in running:
+		return RECURSES
+	running.add(key)
+	for kind, value in traces[key]:
+		if kind == "error":
+			return value
+		error = first_error(traces, value, running)
+		if error is not None:
+			return error
+	running.discard(key)
+	return None
+
+
+# {function key: keys of the functions it calls}
+def find_callees(functions):
+	callees = {}
+	for key, function_node in functions.items():
+		callees[key] = set()
+		for statement_node in function_node.statements:
+			for node in walk(statement_node):
+				if isinstance(node, Call):
+					callees[key].add("{}-{}".format(node.name, len(node.args)))
+	return callees
+
+
+# The functions key calls, directly or not. This is syntactic: a call in a
+# branch or loop that never runs still counts, and so do type errors in code
+# that never runs, which the default mode would never report.
+# {function key: slots a call to it might assign in its caller's frames}
+def find_assigned_slots(functions, callees):
+	params = {}
+	assigned = {}
+	for key, function_node in functions.items():
+		params[key] = {arg.slot for arg in function_node.args}
+		assigned[key] = set()
+		for statement_node in function_node.statements:
+			for node in walk(statement_node):
+				if node.elem_type == "=":
+					assigned[key].add(node.slot)
+		assigned[key] -= params[key]
+
+	changed = True
+	while changed:
+		changed = False
+		for key in assigned:
+			for callee in callees[key]:
+				added = assigned.get(callee, set()) - params[key] - assigned[key]
+				if added:
+					assigned[key] |= added
+					changed = True
+	return assigned
+
+
+def join(env1, env2):
+	if env1 is None:
+		return env2
+	if env2 is None:
+		return env1
+	return {slot: type for slot, type in env1.items() if env2.get(slot) == type}
+
+
+class TypeInference:
+	def __init__(self, functions, callees, short_circuit):
+		self.functions = functions
+		self.short_circuit = short_circuit
+		self.assigned = find_assigned_slots(functions, callees)
+		# What the function being analyzed certainly does before its first if
+		# or while, in order: ("error", (ErrorType, message)), or ("call", key)
+		# for a call to a user function
+		self.trace = []
+		self.certain = True
+		# Off while iterating a loop to its fixpoint, when the types seen are
+		# narrower than the final ones
+		self.marking = True
+
+	# Returns the function's trace
+	def infer_function(self, function_node):
+		self.trace = []
+		self.certain = True
+		self.infer_statements(function_node.statements, {})
+		return self.trace
+
+	def error(self, message):
+		if self.marking and self.certain:
+			self.trace.append(("error", (ErrorType.TYPE_ERROR, message)))
+
+	def call(self, key):
+		if self.certain:
+			self.trace.append(("call", key))
+
+	# Returns the variable types after the statements, or None if they always return
+	def infer_statements(self, statement_nodes, env):
+		for statement_node in statement_nodes:
+			env = self.infer_statement(statement_node, env)
+			if env is None:
+				return None
+		return env
+
+	def infer_statement(self, statement_node, env):
+		match statement_node.elem_type:
+			case "=":
+				type = self.infer_expression(statement_node.expression, env)
+				if type is None:
+					env.pop(statement_node.slot, None)
+				else:
+					env[statement_node.slot] = type
+			case InterpreterBase.FCALL_DEF:
+				self.infer_expression(statement_node, env)
+			case InterpreterBase.RETURN_DEF:
+				if statement_node.expression is not None:
+					self.infer_expression(statement_node.expression, env)
+				return None
+			case InterpreterBase.IF_DEF:
+				return self.infer_if(statement_node, env)
+			case InterpreterBase.WHILE_DEF:
+				return self.infer_while(statement_node, env)
+		return env
+
+	def infer_if(self, if_node, env):
+		self.certain = False
+		self.check_condition(if_node, "if", self.infer_expression(if_node.condition, env))
+		if if_node.condition.elem_type == BOOL:
+			if if_node.condition.val:
+				return self.infer_statements(if_node.statements, dict(env))
+			if if_node.else_statements is None:
+				return env
+			return self.infer_statements(if_node.else_statements, dict(env))
+		then_env = self.infer_statements(if_node.statements, dict(env))
+		if if_node.else_statements is None:
+			return join(then_env, env)
+		return join(then_env, self.infer_statements(if_node.else_statements, dict(env)))
+
+	# The condition is type checked once, on entry, and then re-evaluated after
+	# every iteration
+	def infer_while(self, while_node, env):
+		self.certain = False
+		marking = self.marking
+		self.marking = False
+		entry_env = dict(env)
+		entry_type = self.infer_expression(while_node.condition, env)
+		if while_node.condition.elem_type == BOOL and not while_node.condition.val:
+			self.marking = marking
+			return env
+		head = env
+		while True:
+			body_env = self.infer_statements(while_node.statements, dict(head))
+			if body_env is not None:
+				self.infer_expression(while_node.condition, body_env)
+			new_head = join(head, body_env)
+			if new_head == head:
+				break
+			head = new_head
+		self.marking = marking
+
+		self.check_condition(while_node, "while", entry_type)
+		if marking:
+			# Marks the body for the types at the top of any iteration, and the
+			# condition for both its first evaluation and the later ones
+			body_env = self.infer_statements(while_node.statements, dict(head))
+			self.infer_expression(while_node.condition, join(entry_env, body_env))
+		return head
+
+	def check_condition(self, node, kind, type):
+		if type == BOOL:
+			if self.marking:
+				node.condition_is_bool = True
+		elif type is not None:
+			self.error("Type mismatch on {} condition: {}".format(kind, type))
+
+	# Returns the expression's type, or None if it isn't known
+	def infer_expression(self, expression_node, env):
+		elem_type = expression_node.elem_type
+		if elem_type in literal_types:
+			return elem_type
+		if elem_type == InterpreterBase.VAR_DEF:
+			return env.get(expression_node.slot)
+		if elem_type == InterpreterBase.FCALL_DEF:
+			return self.infer_call(expression_node, env)
+		if (elem_type in unchecked_unary or elem_type in binary_operations) and expression_node.deep:
+			# Not analyzed, as that would recurse as deeply as the expression,
+			# but the calls in it still forget what they might change
+			for node in walk(expression_node):
+				if isinstance(node, Call):
+					self.forget_call(node, env)
+			return None
+		if elem_type in unchecked_unary:
+			return self.infer_unary(expression_node, env)
+		if elem_type in binary_operations:
+			return self.infer_binary(expression_node, env)
+		return None
+
+	def infer_unary(self, node, env):
+		type = self.infer_expression(node.op1, env)
+		# Either the operand has this type or evaluating the operator fails
+		required = BOOL if node.elem_type == InterpreterBase.NOT_DEF else INT
+		if type == required:
+			if self.marking:
+				node.unchecked = unchecked_unary[node.elem_type]
+		elif type is not None and node.op1.elem_type in literal_types:
+			self.error(unary_mismatch_message(node.elem_type, node.op1.get("val")))
+		return required
+
+	def infer_binary(self, node, env):
+		op = node.elem_type
+		type1 = self.infer_expression(node.op1, env)
+		if self.short_circuit and op in logical_operators:
+			# The right operand might not be evaluated
+			certain = self.certain
+			self.certain = False
+			type2 = self.infer_expression(node.op2, env)
+			self.certain = certain
+		else:
+			type2 = self.infer_expression(node.op2, env)
+		if op == "==" or op == "!=":
+			return BOOL
+
+		if op in logical_operators:
+			allowed = (BOOL,)
+			result = BOOL
+			if self.short_circuit:
+				# The right operand might not be evaluated, and the tree-walker
+				# checks each operand on its own
+				if type1 is not None and type1 != BOOL:
+					self.error(unsupported_type_message(op, type1))
+				return result
+		elif op == "+":
+			allowed = (INT, STRING)
+			result = type1 or type2
+			if result not in allowed:
+				result = None
+		elif op in int_operators:
+			allowed = (INT,)
+			result = INT
+		else:
+			allowed = (INT,)
+			result = BOOL
+
+		# Which check fails, and so the message, depends on both types
+		if type1 is None or type2 is None:
+			return result
+		if type1 != type2:
+			self.type_mismatch(node, type1, type2)
+		elif type1 in allowed:
+			if self.marking:
+				node.unchecked = quickened_operations[(op, type1)]
+		elif op in logical_operators:
+			self.type_mismatch(node, type1, type2)
+		elif op in comparison_operators:
+			self.error(not_comparable_message(type1))
+		else:
+			self.error(unsupported_type_message(op, type1))
+		return result
+
+	def type_mismatch(self, node, type1, type2):
+		if node.op1.elem_type in literal_types and node.op2.elem_type in literal_types:
+			self.error(type_mismatch_message(node.elem_type, type1, node.op1.get("val"), type2, node.op2.get("val")))
+
+	def infer_call(self, call_node, env):
+		if call_node.name in builtin_types:
+			for arg_node in call_node.args:
+				self.infer_expression(arg_node, env)
+			if call_node.name != "print" and len(call_node.args) > 1:
+				return None
+			return builtin_types[call_node.name]
+
+		key = "{}-{}".format(call_node.name, len(call_node.args))
+		function_node = self.functions.get(key)
+		if function_node is None:
+			# Fails when it runs, before anything after it
+			self.certain = False
+			return None
+		# Arguments are evaluated with the callee's parameters being bound
+		for arg in function_node.args:
+			env.pop(arg.slot, None)
+		for arg_node in call_node.args:
+			self.infer_expression(arg_node, env)
+		self.call(key)
+		for slot in self.assigned[key]:
+			env.pop(slot, None)
+		return None
+
+	# Forgets the types of everything a call to a user function might change:
+	# its parameters, and the variables it might assign
+	def forget_call(self, call_node, env):
+		key = "{}-{}".format(call_node.name, len(call_node.args))
+		function_node = self.functions.get(key)
+		if function_node is None:
+			self.certain = False
+			return
+		self.call(key)
+		for arg in function_node.args:
+			env.pop(arg.slot, None)
+		for slot in self.assigned[key]:
+			env.pop(slot, None)
+
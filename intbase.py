@@ -51,7 +51,7 @@ class InterpreterBase:
         pass
 
     def get_input(self):
-        if not self.inp:
+        if self.inp is None:
             return input()  # Get input from keyboard if not input list provided
 
         if self.input_cursor < len(self.inp):
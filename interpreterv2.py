@@ -1,132 +1,424 @@
+import sys
+import threading
+
 from brewparse import parse_program
+from element import walk, Call
 from intbase import InterpreterBase
 from intbase import ErrorType
+from operations import unary_operations
+from operations import binary_operations
+from operations import short_circuit_results, check_logical_operand
+from value import int_value, string_value, NIL
+from environment import Environment
+from resolver import resolve
+from optimize import fold_constants
+from memoize import find_pure_functions, MemoCache, memo_key
+import closures
+import bytecode
+import transpile
+from tiering import Tiering
+from quicken import evaluate_binary, quickening_report
+from infer import infer_types
+from natives import NativeFunction
+from program import Program
+
+
+# Steps of Interpreter.evaluate_deep
+APPLY, APPLY_LEAF, RIGHT_OPERAND, UNARY, LEFT, RIGHT = range(6)
+
+# Every backend but the vm runs a Brewin call as nested Python calls: about 5
+# Python frames per call on the tree-walker, plus one per level of expression
+# nesting, and fewer on the others. Past the default max_call_depth, a program
+# runs on a thread of its own with a DEEP_STACK_BYTES stack, with Python's
+# recursion limit raised to FRAMES_PER_CALL frames per call, up to
+# MAX_RECURSION_LIMIT, so that max_call_depth, and not the recursion limit, is
+# what bounds recursion, up to around 100,000 calls.
+DEFAULT_MAX_CALL_DEPTH = 100
+FRAMES_PER_CALL = 20
+MAX_RECURSION_LIMIT = 1000000
+DEEP_STACK_BYTES = 1024 * 1024 * 1024
+deep_stack_lock = threading.Lock()
+
+
+# Calls function on a thread with a deep stack, with the recursion limit
+# raised for max_call_depth calls, and returns its result or raises its exception
+def run_deep(function, max_call_depth):
+	limit = min(max_call_depth * FRAMES_PER_CALL + 1000, MAX_RECURSION_LIMIT)
+	result = []
+	def run():
+		try:
+			result.append((True, function()))
+		except BaseException as e:
+			result.append((False, e))
+	with deep_stack_lock:
+		# The limit is shared by every thread, so it is only ever raised
+		if sys.getrecursionlimit() < limit:
+			sys.setrecursionlimit(limit)
+		stack_size = threading.stack_size(DEEP_STACK_BYTES)
+		try:
+			thread = threading.Thread(target=run, name="brewin")
+			thread.start()
+		finally:
+			threading.stack_size(stack_size)
+	thread.join()
+	succeeded, value = result[0]
+	if succeeded:
+		return value
+	raise value
 
 
 class Interpreter(InterpreterBase):
 	unary_ops = {InterpreterBase.NOT_DEF, InterpreterBase.NEG_DEF}
 	binary_ops = {"+", "-", "*", "/", "&&", "||", "==", "!=", "<", ">", "<=", ">="}
+	leaf_types = {InterpreterBase.VAR_DEF, InterpreterBase.INT_DEF, InterpreterBase.STRING_DEF, InterpreterBase.BOOL_DEF, InterpreterBase.NIL_DEF}
 	types = {InterpreterBase.INT_DEF, InterpreterBase.STRING_DEF, InterpreterBase.BOOL_DEF, InterpreterBase.NIL_DEF}
-
-	def __init__(self, console_output=True, inp=None, trace_output=False):
+	# "tree" walks the AST directly; "closure" compiles each function to closures first (see closures.py);
+	# "vm" compiles the program to bytecode and runs it on a stack machine (see bytecode.py);
+	# "python" compiles each function to a Python function (see transpile.py);
+	# "tiered" walks the AST until a function gets hot, then compiles it to Python (see tiering.py)
+	backends = {"tree", "closure", "vm", "python", "tiered"}
+
+	# optimize=True constant-folds the program before running it (see optimize.py).
+	# max_call_depth is how many Brewin calls may be active at once; tail calls don't add to it.
+	# memoize=True caches the results of pure functions, up to memo_size of them (see memoize.py).
+	# short_circuit=True only evaluates the right operand of && and || when it's needed.
+	# tier_threshold is how many calls and loop iterations promote a function on the tiered backend.
+	# quicken=True specializes operators to the operand types they see on the tree-walker (see quicken.py).
+	# infer_types=True rejects programs with type errors certain to happen, and lets the tree-walker
+	# skip the type checks it can prove will pass (see infer.py).
+	# ast_cache is a directory, or an ASTCache, that parsed programs are kept in between runs (see astcache.py).
+	# lexer="scanner" parses with the hand-written scanner in scanner.py instead of PLY's lexer,
+	# and parser="pratt" with the hand-written parser in pratt.py instead of yacc
+	def __init__(self, console_output=True, inp=None, trace_output=False, backend="tree", optimize=False, max_call_depth=DEFAULT_MAX_CALL_DEPTH, memoize=False, memo_size=1024, short_circuit=False, tier_threshold=1000, quicken=False, infer_types=False, ast_cache=None, lexer="ply", parser="yacc"):
 		super().__init__(console_output, inp)
 		self.trace_output = trace_output
+		if backend not in self.backends:
+			raise ValueError("Unknown backend: {}".format(backend))
+		self.backend = backend
+		self.optimize = optimize
+		self.max_call_depth = max_call_depth
+		if memoize and backend != "tree":
+			raise ValueError("memoize is only supported by the tree backend")
+		self.memoize = memoize
+		self.memo_size = memo_size
+		self.memo = None
+		self.short_circuit = short_circuit
+		self.tier_threshold = tier_threshold
+		self.tiering = None
+		self.quicken = quicken
+		self.infer_types = infer_types
+		# Builtins implemented in Python, by "name-arity" (see natives.py)
+		self.natives = {}
+		if isinstance(ast_cache, str):
+			# Only imported when used, as it's slow to import (see bench_startup)
+			from astcache import ASTCache
+			ast_cache = ASTCache(ast_cache)
+		self.ast_cache = ast_cache
+		if lexer not in ("ply", "scanner"):
+			raise ValueError("Unknown lexer: {}".format(lexer))
+		self.lexer = lexer
+		if parser not in ("yacc", "pratt"):
+			raise ValueError("Unknown parser: {}".format(parser))
+		self.parser = parser
   
 	def run(self, program):
-		self.ast = parse_program(program)
-		self.functions = {}
-		self.frames = [{}]
-		self.recursion_depth = 0
-  
-		if self.ast.get("functions") == None:
+		return self.execute(self.compile(program))
+
+	# Parses, analyzes and compiles source for this interpreter's options (see program.py)
+	def compile(self, source):
+		ast = self.ast_cache.load(source, self.optimize, self.parser, self.lexer) if self.ast_cache is not None else None
+		if ast is None:
+			ast = parse_program(source, self.lexer, self.parser)
+			if self.optimize:
+				fold_constants(ast)
+			if self.ast_cache is not None:
+				self.ast_cache.store(source, self.optimize, ast, self.parser, self.lexer)
+		variable_names = resolve(ast)
+
+		if ast.get("functions") == None:
 			super().error(ErrorType.FAULT_ERROR, "No functions found")
 
 		if self.trace_output:
 			print("Functions:")
-		for func in self.ast.get("functions"):
-			
-			self.set_function(func)
+		functions = {}
+		for func in ast.get("functions"):
+			functions["{}-{}".format(func.get("name"), len(func.get("args")))] = func
 			if self.trace_output:
 				print("{}: {}".format(func.get("name"), func))
 
+		if self.infer_types:
+			errors = infer_types(functions, self.short_circuit)
+			if errors:
+				super().error(*errors[0])
+
+		pure_functions = {}
+		if self.memoize:
+			pure = find_pure_functions(functions, self.natives)
+			pure_functions = {functions[key]: (key, slots) for key, slots in pure.items()}
+			if self.trace_output:
+				print("Pure functions: {}".format(", ".join(pure)))
+
+		compiled = None
+		if self.backend == "closure":
+			compiled = closures.compile_functions(functions, self.natives)
+		elif self.backend == "vm":
+			compiled = bytecode.compile_program(functions, variable_names, self.short_circuit, self.natives)
+		elif self.backend == "python":
+			compiled = transpile.transpile_functions(functions, self.short_circuit, self.natives)
+
+		program = Program(ast, functions, self.natives, variable_names, self.program_options(), pure_functions, compiled)
+		# Calls to missing functions are left to fail when they run
+		for node in walk(ast):
+			if isinstance(node, Call):
+				key = "{}-{}".format(node.name, len(node.args))
+				if node.name in self.builtins or key in program.natives or key in functions:
+					self.resolve_call(node, program)
+		return program
+
+	# The options a Program is compiled for, which whoever executes it must share
+	def program_options(self):
+		return (self.backend, self.optimize, self.short_circuit, self.infer_types, self.memoize)
+
+	# Runs a Program from compile(), reading input from inp if it's given
+	def execute(self, program, inp=None):
+		if program.options != self.program_options():
+			raise ValueError("Program was compiled with different options")
+		if inp is not None:
+			self.inp = inp
+		self.reset()
+		self.program = program
+		self.ast = program.ast
+		self.functions = program.functions
+		self.functions_epoch = program.functions_epoch
+		self.variable_names = program.variable_names
+		self.pure_functions = program.pure_functions
+		self.env = Environment(len(self.variable_names))
+		self.recursion_depth = 0
+		self.memo = MemoCache(self.memo_size) if self.memoize else None
+		self.tiering = None
+
+		if self.backend == "closure":
+			self.closure_functions = program.compiled
+		elif self.backend == "python":
+			self.python_functions = program.compiled
+		elif self.backend == "tiered":
+			self.tiering = Tiering(self, program.functions, program.natives, self.tier_threshold)
+
 		if self.get_function("main", 0) != None:
 			if self.trace_output:
 				print("Running main entrypoint")
-			func = self.get_function("main", 0)
-			return self.run_function(func)
+			if self.backend == "vm":
+				return bytecode.execute(self, program.compiled)
+			# The vm keeps Brewin calls off the Python stack; the other backends
+			# recurse, so a deep enough program can run out of Python stack first
+			try:
+				if self.max_call_depth > DEFAULT_MAX_CALL_DEPTH:
+					return run_deep(self.run_main, self.max_call_depth)
+				return self.run_main()
+			except RecursionError:
+				super().error(ErrorType.FAULT_ERROR, "Recursion depth exceeded")
+			finally:
+				if self.tiering is not None:
+					self.tiering.stop()
 
 		super().error(ErrorType.NAME_ERROR, "No main function found")
 
-	# TODO: Refactor scoping to use a single method call in all the relevant places
-	def run_function(self, function_node):
-		if self.trace_output:
-			print("Running function: {}".format(function_node.get("name")))
-   
-		f_name = function_node.get("name")
-		args = function_node.get("args")
-
-		if f_name == "inputi":
-			return self.inputi(args)
-
-		elif f_name == "inputs":
-			return self.inputs(args)
+	def run_main(self):
+		if self.backend == "closure":
+			return closures.run_main(self)
+		if self.backend == "python":
+			return transpile.run_main(self)
+		return self.run_function(Call(InterpreterBase.FCALL_DEF, "main", []))
 
-		elif f_name == "print":
-			return self.print(args)
-   
-		elif self.get_function(f_name, len(args)) != None:
-			self.recursion_depth += 1
-			if self.recursion_depth > 100:
-				super().error(ErrorType.FAULT_ERROR, "Recursion depth exceeded")
-			function_node = self.get_function(f_name, len(args))
+	def run_function(self, call_node):
+		if self.trace_output:
+			print("Running function: {}".format(call_node.get("name")))
+
+		# Each call site caches what it resolved to, for the program it was resolved in
+		if call_node.call_epoch is not self.functions_epoch:
+			self.resolve_call(call_node, self.program)
+		return call_node.call_handler(self, call_node)
+
+	def resolve_call(self, call_node, program):
+		f_name = call_node.get("name")
+		key = "{}-{}".format(f_name, len(call_node.get("args")))
+		native = program.natives.get(key)
+		if f_name in self.builtins:
+			call_node.call_handler = self.builtins[f_name]
+			call_node.call_target = None
+		elif native is not None:
+			call_node.call_handler = native.run_call
+			call_node.call_target = None
+		else:
+			call_node.call_target = program.functions.get(key) or self.get_function(f_name, len(call_node.get("args")))
+			call_node.call_handler = Interpreter.run_user_function
+		call_node.call_epoch = program.functions_epoch
+
+	# `return f(...)` to a user function comes back from run_statement as the
+	# call node itself, and is run by this loop instead of recursing. The frames
+	# of the function making the tail call stay visible to the callee (scoping
+	# is dynamic); they are all dropped once the last call in the chain returns.
+	def run_tail_call(self, call_node):
+		if self.trace_output:
+			print("Running function: {}".format(call_node.get("name")))
+
+		if call_node.call_epoch is not self.functions_epoch:
+			self.resolve_call(call_node, self.program)
+		if call_node.call_handler is Interpreter.run_user_function:
+			return call_node
+		return call_node.call_handler(self, call_node)
+
+	def run_user_function(self, call_node):
+		self.recursion_depth += 1
+		if self.recursion_depth > self.max_call_depth:
+			super().error(ErrorType.FAULT_ERROR, "Recursion depth exceeded")
+		base = self.env.depth()
+		memo_keys = []
+		tiering = self.tiering
+		if tiering is not None:
+			caller = tiering.current
+
+		while True:
+			args = call_node.args
+			function_node = call_node.call_target
 			if self.trace_output:
 				print("Running function: {}".format(function_node))
-    
-			self.frames.append({})
+
+			self.env.push_frame()
 
 			# We don't call the set_variable function here because we don't want to shadow variables
 			for i in range(len(args)):
-				self.frames[-1][function_node.get("args")[i].get("name")] = self.evaluate_expression(args[i])
-			for statement_node in function_node.get("statements"):
+				self.env.bind(function_node.args[i].slot, self.evaluate_expression(args[i]))
+			if tiering is not None:
+				compiled = tiering.promoted.get(function_node)
+				if compiled is not None:
+					ret = tiering.run_compiled(compiled)
+					break
+				tiering.count(function_node)
+				tiering.current = function_node
+			if self.memo is not None and function_node in self.pure_functions:
+				key = self.memo_lookup(function_node)
+				if key is not None:
+					ret = self.memo.get(key)
+					if ret is not None:
+						break
+					memo_keys.append(key)
+			for statement_node in function_node.statements:
 				ret = self.run_statement(statement_node)
-				if ret and ret.r:
-					self.frames.pop()
-					ret.r = False
-					return ret
-			self.frames.pop()
-			return Value(InterpreterBase.NIL_DEF, ret=False)
-   
-		else:
-			super().error(ErrorType.NAME_ERROR, "Unknown Function Referenced: {}, taking {} args".format(f_name, len(args)))
+				if ret is not None:
+					break
+			else:
+				ret = NIL
+			if type(ret) is not Call:
+				break
+			call_node = ret
+
+		# Every function in a chain of tail calls returns the same value
+		for key in memo_keys:
+			self.memo.put(key, ret)
+		# Also drops any if/while frames a return left open
+		self.env.pop_frames_to(base)
+		self.recursion_depth -= 1
+		if tiering is not None:
+			tiering.current = caller
+		return ret
+
+	# The memo cache key for the call to function_node whose arguments were just
+	# bound, or None if a variable it depends on is bound outside of it
+	def memo_lookup(self, function_node):
+		function_key, slots = self.pure_functions[function_node]
+		bindings = self.env.bindings
+		for slot in slots:
+			if bindings[slot]:
+				return None
+		return memo_key(function_key, [bindings[arg.slot][-1] for arg in function_node.args])
    
 	def run_while(self, while_node):
 		if self.trace_output:
 				print("Running while: {}".format(while_node))
-		condition = self.evaluate_expression(while_node.get("condition"))
+		condition = self.evaluate_expression(while_node.condition)
 
-		if condition.elem_type != InterpreterBase.BOOL_DEF:
+		if not while_node.condition_is_bool and condition.elem_type != InterpreterBase.BOOL_DEF:
 			super().error(ErrorType.TYPE_ERROR, "Type mismatch on while condition: {}".format(condition.elem_type))
-		self.frames.append({})
+		if while_node.scoped:
+			self.env.push_frame()
+		tiering = self.tiering
   
 		while condition.val():
-			for statement_node in while_node.get("statements"):
+			for statement_node in while_node.statements:
 				ret = self.run_statement(statement_node)
-				if ret and ret.r:
-					self.frames.pop()
+				if ret is not None:
 					return ret
-			condition = self.evaluate_expression(while_node.get("condition"))
-		self.frames.pop()
+			if tiering is not None:
+				tiering.count(tiering.current)
+				# Once its function is promoted, the loop finishes in compiled code
+				if tiering.current in tiering.promoted:
+					loop = tiering.compiled_loop(while_node)
+					if loop is not None:
+						return tiering.run_compiled(loop)
+			condition = self.evaluate_expression(while_node.condition)
+		if while_node.scoped:
+			self.env.pop_frame()
    
 	def run_if(self, if_node):
 		if self.trace_output:
 				print("Running if: {}".format(if_node))
-		condition = self.evaluate_expression(if_node.get("condition"))
+		condition = self.evaluate_expression(if_node.condition)
 		
-		if condition.elem_type != InterpreterBase.BOOL_DEF:
+		if not if_node.condition_is_bool and condition.elem_type != InterpreterBase.BOOL_DEF:
 			super().error(ErrorType.TYPE_ERROR, "Type mismatch on if condition: {}".format(condition.elem_type))
-		self.frames.append({})
   
 		if condition.val():
-			for statement_node in if_node.get("statements"):
-				ret = self.run_statement(statement_node)
-				if ret and ret.r:
-					self.frames.pop()
-					return ret
-		elif if_node.get("else_statements") != None:
-			for statement_node in if_node.get("else_statements"):
-				ret = self.run_statement(statement_node)
-				if ret and ret.r:
-					self.frames.pop()
-					return ret
-		self.frames.pop()
+			statements = if_node.statements
+			scoped = if_node.scoped
+		elif if_node.else_statements != None:
+			statements = if_node.else_statements
+			scoped = if_node.else_scoped
+		else:
+			return None
+		if scoped:
+			self.env.push_frame()
+		for statement_node in statements:
+			ret = self.run_statement(statement_node)
+			if ret is not None:
+				return ret
+		if scoped:
+			self.env.pop_frame()
   
+	def call_inputi(self, call_node):
+		return self.inputi(call_node.args)
+
+	def call_inputs(self, call_node):
+		return self.inputs(call_node.args)
+
+	def call_print(self, call_node):
+		return self.print(call_node.args)
+
+	# Call handlers for the built-in functions, by name
+	builtins = {
+		"inputi": call_inputi,
+		"inputs": call_inputs,
+		"print": call_print,
+	}
+
+	# Registers a builtin implemented in Python, called as name(...) with arity
+	# arguments; it takes the place of any Brewin function with that name and arity
+	def register_builtin(self, name, arity, handler, pure=True):
+		self.register_builtins([NativeFunction(name, arity, handler, pure)])
+
+	def register_builtins(self, natives):
+		for native in natives:
+			if native.name in self.builtins:
+				raise ValueError("Can't replace builtin: {}".format(native.name))
+			self.natives[native.key] = native
+
 	def inputi(self, args):
 		if len(args) > 1:
 				super().error(ErrorType.NAME_ERROR, f"No inputi() function found that takes > 1 parameter")
 		elif len(args) == 1:
 			super().output(self.evaluate_expression(args[0]).val())
 
-		return Value(InterpreterBase.INT_DEF, val=int(super().get_input()))
+		return int_value(int(super().get_input()))
 
 	def inputs(self, args):
 		if len(args) > 1:
@@ -134,18 +426,21 @@ class Interpreter(InterpreterBase):
 		elif len(args) == 1:
 			super().output(self.evaluate_expression(args[0]).val())
 
-		return Value(InterpreterBase.STRING_DEF, val=str(super().get_input()))
+		return string_value(str(super().get_input()))
 
 	def print(self, args):
-		eval_args = [self.evaluate_expression(arg) for arg in args]
+		return self.print_values([self.evaluate_expression(arg) for arg in args])
+
+	def print_values(self, eval_args):
 		string_args = [str(arg.val()) for arg in eval_args]
 		string_args = [arg.lower() if arg == "True" or arg == "False" else arg for arg in string_args]
 		super().output(''.join(string_args))
-		return Value(InterpreterBase.NIL_DEF, ret=False)
+		return NIL
   
 	def print_frames(self):
 		print("Frames:")
-		for frame in self.frames:
+		for frame in self.env.snapshot():
+			frame = {self.variable_names[slot]: value for slot, value in frame.items()}
 			print(frame)
 			for var in frame:
 				print("\t{}: {}".format(var, frame[var]))
@@ -156,29 +451,29 @@ class Interpreter(InterpreterBase):
 		if statement_node.elem_type == "=":
 			self.run_assignment(statement_node)
 		elif statement_node.elem_type == InterpreterBase.FCALL_DEF:
-			return self.run_function(statement_node)
+			self.run_function(statement_node)
 		elif statement_node.elem_type == InterpreterBase.RETURN_DEF:
-			if statement_node.get("expression") != None:
-				return self.evaluate_expression(statement_node.get("expression")).ret()
-			else:
-				return Value(InterpreterBase.NIL_DEF, ret=True)
+			if statement_node.expression == None:
+				return NIL
+			if statement_node.expression.elem_type == InterpreterBase.FCALL_DEF:
+				return self.run_tail_call(statement_node.expression)
+			return self.evaluate_expression(statement_node.expression)
 		elif statement_node.elem_type == InterpreterBase.IF_DEF:
 			return self.run_if(statement_node)
 		elif statement_node.elem_type == InterpreterBase.WHILE_DEF:
 			return self.run_while(statement_node)
 
 	def run_assignment(self, statement_node):
-		expression_node = statement_node.get("expression")
-		var_name = statement_node.get("name")
+		expression_node = statement_node.expression
 
 		if expression_node.elem_type in self.binary_ops or expression_node.elem_type in self.unary_ops:
-			self.set_variable(var_name, self.evaluate_expression(expression_node))
+			self.set_variable(statement_node, self.evaluate_expression(expression_node))
 		elif expression_node.elem_type in self.types:
-			self.set_variable(var_name, self.evaluate_expression(expression_node))
+			self.set_variable(statement_node, self.evaluate_expression(expression_node))
 		elif expression_node.elem_type == "fcall":
-			self.set_variable(var_name, self.run_function(expression_node))
+			self.set_variable(statement_node, self.run_function(expression_node))
 		elif expression_node.elem_type == "var":
-			self.set_variable(var_name, self.evaluate_expression(expression_node))
+			self.set_variable(statement_node, self.evaluate_expression(expression_node))
 		else:
 			super().error(ErrorType.TYPE_ERROR, f"Invalid assignment: {expression_node.elem_type}")
 
@@ -187,171 +482,125 @@ class Interpreter(InterpreterBase):
 			case "fcall":
 				return self.run_function(expression_node)
 			case "var":
-				var = expression_node.get("name")
-				return self.get_variable(var)
-			case "int":
-				return Value(InterpreterBase.INT_DEF, val=expression_node.get("val"))
-			case "string":
-				return Value(InterpreterBase.STRING_DEF, val=expression_node.get("val"))
-			case "bool":
-				return Value(InterpreterBase.BOOL_DEF, val=expression_node.get("val"))
-			case "nil":
-				return Value(InterpreterBase.NIL_DEF, val=expression_node.get("val"))
+				return self.get_variable(expression_node)
+			case "int" | "string" | "bool" | "nil":
+				return expression_node.value
 		
 		if expression_node.elem_type in self.unary_ops:
-			op = self.evaluate_expression(expression_node.get("op1"))
-			match expression_node.elem_type:
-				case InterpreterBase.NOT_DEF:
-					if op.elem_type != InterpreterBase.BOOL_DEF:
-						super().error(ErrorType.TYPE_ERROR, "Type mismatch on unary operation: {} {}".format(expression_node.elem_type, op.val()))
-					return Value(InterpreterBase.BOOL_DEF, val=(not op.val()))
-				case InterpreterBase.NEG_DEF:
-					if op.elem_type != InterpreterBase.INT_DEF:
-						super().error(ErrorType.TYPE_ERROR, "Type mismatch on unary operation: {} {}".format(expression_node.elem_type, op.val()))
-					return Value(InterpreterBase.INT_DEF, val=(-op.val()))
+			if expression_node.deep:
+				return self.evaluate_deep(expression_node)
+			op = self.evaluate_expression(expression_node.op1)
+			if self.infer_types and expression_node.unchecked is not None:
+				return expression_node.unchecked(self, op)
+			return unary_operations[expression_node.elem_type](self, op)
  
 		elif expression_node.elem_type in self.binary_ops:
-			op1 = self.evaluate_expression(expression_node.get("op1"))
-			op2 = self.evaluate_expression(expression_node.get("op2"))
-   
-			# Special case for equality / ineqality operators - we don't need to check for type equality
-			if expression_node.elem_type == "==":
-				if op1.type() != op2.type():
-					return Value(InterpreterBase.BOOL_DEF, val=False)
-				return Value(InterpreterBase.BOOL_DEF, val=(op1.val() == op2.val()))
-			elif expression_node.elem_type == "!=":
-				if op1.type() != op2.type():
-					return Value(InterpreterBase.BOOL_DEF, val=True)
-				return Value(InterpreterBase.BOOL_DEF, val=(op1.val() != op2.val()))
-
-			if op1.elem_type != op2.elem_type:
-				super().error(ErrorType.TYPE_ERROR, "Type mismatch on binary operation between {} and {}: {} {} {}".format(op1.elem_type, op2.elem_type, op1.val(), expression_node.elem_type, op2.val()))
-			match expression_node.elem_type:
-				case "+":
-					if op1.elem_type not in [InterpreterBase.INT_DEF, InterpreterBase.STRING_DEF]:
-						super().error(ErrorType.TYPE_ERROR, "Unsupported type {} for binary operator '{}'".format(op1.elem_type, expression_node.elem_type))
-					sum = op1.val() + op2.val()
-					return Value(op1.elem_type, val=sum)
-				case "-":
-					if op1.elem_type != InterpreterBase.INT_DEF:
-						super().error(ErrorType.TYPE_ERROR, "Unsupported type {} for binary operator '{}'".format(op1.elem_type, expression_node.elem_type))
-					diff = op1.val() - op2.val()
-					return Value(InterpreterBase.INT_DEF, val=diff)
-				case "*":
-					if op1.elem_type != InterpreterBase.INT_DEF:
-						super().error(ErrorType.TYPE_ERROR, "Unsupported type {} for binary operator '{}'".format(op1.elem_type, expression_node.elem_type))
-					prod = op1.val() * op2.val()
-					return Value(InterpreterBase.INT_DEF, val=prod)
-				case "/":
-					if op1.elem_type != InterpreterBase.INT_DEF:
-						super().error(ErrorType.TYPE_ERROR, "Unsupported type {} for binary operator '{}'".format(op1.elem_type, expression_node.elem_type))
-					if op2.val() == 0:
-						super().error(ErrorType.FAULT_ERROR, "Division by zero")
-					quot = op1.val() // op2.val()
-					return Value(InterpreterBase.INT_DEF, val=quot)
-				case "&&":
-					if op1.elem_type != InterpreterBase.BOOL_DEF:
-						super().error(ErrorType.TYPE_ERROR, "Type mismatch on binary operation between {} and {}: {} {} {}".format(op1.elem_type, op2.elem_type, op1.val(), expression_node.elem_type, op2.val()))
-					return Value(InterpreterBase.BOOL_DEF, val=(op1.val() and op2.val()))
-				case "||":
-					if op1.elem_type != InterpreterBase.BOOL_DEF:
-						super().error(ErrorType.TYPE_ERROR, "Type mismatch on binary operation between {} and {}: {} {} {}".format(op1.elem_type, op2.elem_type, op1.val(), expression_node.elem_type, op2.val()))
-					return Value(InterpreterBase.BOOL_DEF, val=(op1.val() or op2.val()))
-				case "<":
-					if op1.elem_type != InterpreterBase.INT_DEF:
-						super().error(ErrorType.TYPE_ERROR, "Comparison not supported for type: {}".format(op1.elem_type))
-					return Value(InterpreterBase.BOOL_DEF, val=(op1.val() < op2.val()))
-				case ">":
-					if op1.elem_type != InterpreterBase.INT_DEF:
-						super().error(ErrorType.TYPE_ERROR, "Comparison not supported for type: {}".format(op1.elem_type))
-					return Value(InterpreterBase.BOOL_DEF, val=(op1.val() > op2.val()))
-				case "<=":
-					if op1.elem_type != InterpreterBase.INT_DEF:
-						super().error(ErrorType.TYPE_ERROR, "Comparison not supported for type: {}".format(op1.elem_type))
-					return Value(InterpreterBase.BOOL_DEF, val=(op1.val() <= op2.val()))
-				case ">=":
-					if op1.elem_type != InterpreterBase.INT_DEF:
-						super().error(ErrorType.TYPE_ERROR, "Comparison not supported for type: {}".format(op1.elem_type))
-					return Value(InterpreterBase.BOOL_DEF, val=(op1.val() >= op2.val()))
+			if expression_node.deep:
+				return self.evaluate_deep(expression_node)
+			if self.short_circuit and expression_node.elem_type in short_circuit_results:
+				return self.evaluate_logical(expression_node)
+			op1 = self.evaluate_expression(expression_node.op1)
+			op2 = self.evaluate_expression(expression_node.op2)
+			if self.infer_types and expression_node.unchecked is not None:
+				return expression_node.unchecked(self, op1, op2)
+			if self.quicken:
+				return evaluate_binary(self, expression_node, op1, op2)
+			return binary_operations[expression_node.elem_type](self, op1, op2)
  
 		else:
 			super().error(ErrorType.TYPE_ERROR, "Unknown expression type: {}".format(expression_node.elem_type))
 
+	def evaluate_logical(self, expression_node):
+		op = expression_node.elem_type
+		op1 = check_logical_operand(self, op, self.evaluate_expression(expression_node.op1))
+		if op1.val() == short_circuit_results[op]:
+			return op1
+		return check_logical_operand(self, op, self.evaluate_expression(expression_node.op2))
+
+	# Evaluates an operator marked deep by resolve() without recursing on its
+	# operands. It walks down the chain of left operands, leaving (node, step)
+	# pairs on a work stack, evaluates the leaf at the bottom, and then works
+	# back up, applying operators to the value stack until one of them has a
+	# right operand that needs walking down in turn.
+	def evaluate_deep(self, node):
+		binary_ops = self.binary_ops
+		unary_ops = self.unary_ops
+		leaf_types = self.leaf_types
+		short_circuit = self.short_circuit
+		values = []
+		work = []
+		push = work.append
+		while True:
+			while True:
+				elem_type = node.elem_type
+				if elem_type in binary_ops:
+					if short_circuit and elem_type in short_circuit_results:
+						push((node, LEFT))
+					elif node.op2.elem_type in leaf_types:
+						push((node, APPLY_LEAF))
+					else:
+						push((node, RIGHT_OPERAND))
+					node = node.op1
+				elif elem_type in unary_ops:
+					push((node, UNARY))
+					node = node.op1
+				else:
+					break
+			values.append(self.get_variable(node) if elem_type == "var" else self.evaluate_expression(node))
+
+			while work:
+				node, step = work.pop()
+				if step == APPLY_LEAF or step == APPLY:
+					# A leaf right operand is read now, after the left one is evaluated
+					op2 = self.evaluate_expression(node.op2) if step == APPLY_LEAF else values.pop()
+					op1 = values[-1]
+					if self.infer_types and node.unchecked is not None:
+						values[-1] = node.unchecked(self, op1, op2)
+					elif self.quicken:
+						values[-1] = evaluate_binary(self, node, op1, op2)
+					else:
+						values[-1] = binary_operations[node.elem_type](self, op1, op2)
+				elif step == RIGHT_OPERAND:
+					push((node, APPLY))
+					node = node.op2
+					break
+				elif step == UNARY:
+					if self.infer_types and node.unchecked is not None:
+						values[-1] = node.unchecked(self, values[-1])
+					else:
+						values[-1] = unary_operations[node.elem_type](self, values[-1])
+				elif step == LEFT:
+					op = node.elem_type
+					op1 = values[-1] = check_logical_operand(self, op, values[-1])
+					if op1.val() != short_circuit_results[op]:
+						values.pop()
+						push((node, RIGHT))
+						node = node.op2
+						break
+				else:
+					values[-1] = check_logical_operand(self, node.elem_type, values[-1])
+			else:
+				return values[0]
+
+	# Hits, misses and deopts of every operator evaluated with quicken=True
+	def quickening_report(self):
+		return quickening_report(self.ast)
+
 	# Setters and getters
  
-	def set_function(self, func):
-		self.functions["{}-{}".format(func.get("name"), len(func.get("args")))] = func
-  
 	def get_function(self, func_name, num_args):
-		if self.functions.get("{}-{}".format(func_name, num_args)) != None:
-			return self.functions["{}-{}".format(func_name, num_args)]
+		function_node = self.functions.get("{}-{}".format(func_name, num_args))
+		if function_node != None:
+			return function_node
 		else:
 			super().error(ErrorType.NAME_ERROR, "Unknown Function Referenced: {}, taking {} args".format(func_name, num_args))
   
-	def set_variable(self, var_name, value):
-		for frame in self.frames[::-1]:
-			if frame.get(var_name) != None:
-				frame[var_name] = value
-				return
-		self.frames[-1][var_name] = value
+	# Variables are addressed by the slot resolve gave their node
+	def set_variable(self, node, value):
+		self.env.set(node.slot, value)
   
-	def get_variable(self, var_name):
-		var = None
-		for frame in self.frames[::-1]:
-			if frame.get(var_name) != None:
-				var = frame.get(var_name)
-				break
+	def get_variable(self, node):
+		var = self.env.get(node.slot)
 		if var == None:
-			super().error(ErrorType.NAME_ERROR, f"Unknown variable: {var_name}")
+			super().error(ErrorType.NAME_ERROR, "Unknown variable: {}".format(node.get("name")))
 		return var
-
-
-from enum import Enum
-
-
-# Enumerated type for our different language data types
-# class Type(Enum):
-# 	INT = 1
-# 	BOOL = 2
-# 	STRING = 3
-# 	NIL = 4
-
-
-# Represents a value, which has a type and its value
-class Value:
-	def __init__(self, type, val=None, ret=False):
-		self.elem_type = type
-		self.v = val
-		self.r = ret
-
-	def val(self):
-		return self.v
-
-	def type(self):
-		return self.elem_type
-
-	def set(self, other):
-		self.elem_type = other.elem_type
-		self.v = other.v
-  
-	def ret(self):
-		self.r = True
-		return self
-  
-	def __str__(self):
-		return str(self.v)
-
-
-def create_value(val):
-	if val == InterpreterBase.TRUE_DEF:
-		return Value(Type.BOOL, True)
-	elif val == InterpreterBase.FALSE_DEF:
-		return Value(Type.BOOL, False)
-	elif val == InterpreterBase.NIL_DEF:
-		return Value(Type.NIL, None)
-	elif isinstance(val, str):
-		return Value(Type.STRING, val)
-	elif isinstance(val, int):
-		return Value(Type.INT, val)
-	else:
-		raise ValueError("Unknown value type")
\ No newline at end of file
@@ -0,0 +1,115 @@
+from collections import OrderedDict
+
+from element import walk, Call
+from intbase import InterpreterBase
+
+
+# Memoization of pure functions (see Interpreter(memoize=True)).
+#
+# A function is pure if it never calls print, inputi or inputs, and only calls
+# functions that are pure themselves. Because scopes are dynamic that isn't
+# quite enough: a variable that isn't one of the function's parameters is
+# looked up in (or assigned into) whatever frames its caller has open. So each
+# pure function also gets the slots of every such variable used by it or by
+# anything it calls, and a call is only memoized when none of those slots is
+# bound when the call starts. Then everything the call reads comes from its
+# arguments, and everything it writes is dropped with its frames when it returns.
+
+builtin_names = {"inputi", "inputs", "print"}
+
+
+# Returns {function key: slots that must be unbound} for the pure functions in
+# `functions`, the function table built by Interpreter.run. Natives are pure
+# unless registered with pure=False.
+def find_pure_functions(functions, natives):
+	callees = {}
+	required = {}
+	for key, native in natives.items():
+		if native.pure:
+			callees[key] = (set(), set())
+			required[key] = set()
+	for key, function_node in functions.items():
+		if key in natives:
+			continue
+		params = {arg.slot for arg in function_node.args}
+		calls = set()
+		slots = set()
+		pure = True
+		for statement_node in function_node.statements:
+			for node in walk(statement_node):
+				if isinstance(node, Call):
+					if node.name in builtin_names:
+						pure = False
+					calls.add("{}-{}".format(node.name, len(node.args)))
+				elif node.elem_type == InterpreterBase.VAR_DEF or node.elem_type == "=":
+					if node.slot not in params:
+						slots.add(node.slot)
+		if pure:
+			callees[key] = (params, calls)
+			required[key] = slots
+
+	# Drops functions that call something impure (or missing), and adds the
+	# callees' variables to their callers', until nothing changes
+	changed = True
+	while changed:
+		changed = False
+		for key in list(required):
+			params, calls = callees[key]
+			if any(call not in required for call in calls):
+				del required[key]
+				changed = True
+				continue
+			slots = required[key]
+			for call in calls:
+				added = required[call] - params - slots
+				if added:
+					slots |= added
+					changed = True
+	return {key: tuple(sorted(slots)) for key, slots in required.items() if key not in natives}
+
+
+# A bounded LRU cache of call results, keyed by function key and argument
+# values, that counts hits, misses and evictions per function
+class MemoCache:
+	def __init__(self, size):
+		self.size = size
+		self.entries = OrderedDict()
+		self.counts = {}
+
+	def get(self, key):
+		counts = self.count(key[0])
+		ret = self.entries.get(key)
+		if ret is None:
+			counts[1] += 1
+			return None
+		self.entries.move_to_end(key)
+		counts[0] += 1
+		return ret
+
+	def put(self, key, ret):
+		self.entries[key] = ret
+		self.entries.move_to_end(key)
+		if len(self.entries) > self.size:
+			evicted, _ = self.entries.popitem(last=False)
+			self.count(evicted[0])[2] += 1
+
+	def count(self, function_key):
+		counts = self.counts.get(function_key)
+		if counts is None:
+			counts = self.counts[function_key] = [0, 0, 0]
+		return counts
+
+	# {function key: (hits, misses, evictions)}
+	def stats(self):
+		return {function_key: tuple(counts) for function_key, counts in self.counts.items()}
+
+	def report(self):
+		lines = []
+		for function_key, (hits, misses, evictions) in self.stats().items():
+			lines.append("{}: {} hits, {} misses ({:.1%} hit rate), {} evictions".format(function_key, hits, misses, hits / (hits + misses), evictions))
+		return lines
+
+
+# The cache key for a call to function_key with the argument Values `args`
+def memo_key(function_key, args):
+	return (function_key, tuple((arg.elem_type, arg.v) for arg in args))
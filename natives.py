@@ -0,0 +1,59 @@
+from intbase import InterpreterBase
+from intbase import ErrorType
+from value import int_value
+
+
+# Builtins implemented in Python (see Interpreter.register_builtin). A native
+# is called by name and exact arity, like a Brewin function, and takes
+# precedence over a Brewin function with the same name and arity. Its
+# arguments are evaluated in the caller's scope, as for print, and handed to
+# the handler as a list of Values; the handler returns a Value and reports
+# errors through interp.error.
+#
+# pure=False marks a native with side effects, so memoize.py won't cache the
+# functions that call it.
+
+class NativeFunction:
+	def __init__(self, name, arity, handler, pure=True):
+		self.name = name
+		self.arity = arity
+		self.key = "{}-{}".format(name, arity)
+		self.handler = handler
+		self.pure = pure
+
+	# The tree-walker's call handler for a call to this native
+	def run_call(self, interp, call_node):
+		return self.handler(interp, [interp.evaluate_expression(arg_node) for arg_node in call_node.args])
+
+
+def check_type(interp, name, value, type):
+	if value.elem_type != type:
+		interp.error(ErrorType.TYPE_ERROR, "{}() expects {}, got {}".format(name, type, value.elem_type))
+
+
+def native_strlen(interp, args):
+	check_type(interp, "strlen", args[0], InterpreterBase.STRING_DEF)
+	return int_value(len(args[0].v))
+
+def native_abs(interp, args):
+	check_type(interp, "abs", args[0], InterpreterBase.INT_DEF)
+	return int_value(abs(args[0].v))
+
+def native_min(interp, args):
+	check_type(interp, "min", args[0], InterpreterBase.INT_DEF)
+	check_type(interp, "min", args[1], InterpreterBase.INT_DEF)
+	return args[0] if args[0].v <= args[1].v else args[1]
+
+def native_max(interp, args):
+	check_type(interp, "max", args[0], InterpreterBase.INT_DEF)
+	check_type(interp, "max", args[1], InterpreterBase.INT_DEF)
+	return args[0] if args[0].v >= args[1].v else args[1]
+
+
+# Helpers programs commonly write in Brewin, for Interpreter.register_builtins
+standard_natives = [
+	NativeFunction("strlen", 1, native_strlen),
+	NativeFunction("abs", 1, native_abs),
+	NativeFunction("min", 2, native_min),
+	NativeFunction("max", 2, native_max),
+]
@@ -0,0 +1,160 @@
+from intbase import InterpreterBase
+from intbase import ErrorType
+from value import int_value, bool_value, string_value, TRUE, FALSE
+
+
+# Brewin's unary and binary operators, keyed by elem_type. Each one takes the
+# interpreter (used for error reporting) and its already-evaluated operands, so
+# every execution backend shares the same type checks and error messages.
+
+# The error messages, also used by infer.py to report the same errors before a run
+def type_mismatch_message(op, type1, val1, type2, val2):
+	return "Type mismatch on binary operation between {} and {}: {} {} {}".format(type1, type2, val1, op, val2)
+
+def unsupported_type_message(op, type):
+	return "Unsupported type {} for binary operator '{}'".format(type, op)
+
+def not_comparable_message(type):
+	return "Comparison not supported for type: {}".format(type)
+
+def unary_mismatch_message(op, val):
+	return "Type mismatch on unary operation: {} {}".format(op, val)
+
+
+def type_mismatch(interp, op, op1, op2):
+	interp.error(ErrorType.TYPE_ERROR, type_mismatch_message(op, op1.elem_type, op1.val(), op2.elem_type, op2.val()))
+
+def unsupported_type(interp, op, op1):
+	interp.error(ErrorType.TYPE_ERROR, unsupported_type_message(op, op1.elem_type))
+
+def not_comparable(interp, op1):
+	interp.error(ErrorType.TYPE_ERROR, not_comparable_message(op1.elem_type))
+
+
+def op_not(interp, op):
+	if op.elem_type != InterpreterBase.BOOL_DEF:
+		interp.error(ErrorType.TYPE_ERROR, unary_mismatch_message(InterpreterBase.NOT_DEF, op.val()))
+	return bool_value(not op.val())
+
+def op_neg(interp, op):
+	if op.elem_type != InterpreterBase.INT_DEF:
+		interp.error(ErrorType.TYPE_ERROR, unary_mismatch_message(InterpreterBase.NEG_DEF, op.val()))
+	return int_value(-op.val())
+
+
+# Special case for equality / ineqality operators - we don't need to check for type equality
+def op_eq(interp, op1, op2):
+	if op1.type() != op2.type():
+		return FALSE
+	return bool_value(op1.val() == op2.val())
+
+def op_ne(interp, op1, op2):
+	if op1.type() != op2.type():
+		return TRUE
+	return bool_value(op1.val() != op2.val())
+
+def op_add(interp, op1, op2):
+	if op1.elem_type != op2.elem_type:
+		type_mismatch(interp, "+", op1, op2)
+	if op1.elem_type not in [InterpreterBase.INT_DEF, InterpreterBase.STRING_DEF]:
+		unsupported_type(interp, "+", op1)
+	if op1.elem_type == InterpreterBase.INT_DEF:
+		return int_value(op1.val() + op2.val())
+	return string_value(op1.val() + op2.val())
+
+def op_sub(interp, op1, op2):
+	if op1.elem_type != op2.elem_type:
+		type_mismatch(interp, "-", op1, op2)
+	if op1.elem_type != InterpreterBase.INT_DEF:
+		unsupported_type(interp, "-", op1)
+	return int_value(op1.val() - op2.val())
+
+def op_mul(interp, op1, op2):
+	if op1.elem_type != op2.elem_type:
+		type_mismatch(interp, "*", op1, op2)
+	if op1.elem_type != InterpreterBase.INT_DEF:
+		unsupported_type(interp, "*", op1)
+	return int_value(op1.val() * op2.val())
+
+def op_div(interp, op1, op2):
+	if op1.elem_type != op2.elem_type:
+		type_mismatch(interp, "/", op1, op2)
+	if op1.elem_type != InterpreterBase.INT_DEF:
+		unsupported_type(interp, "/", op1)
+	if op2.val() == 0:
+		interp.error(ErrorType.FAULT_ERROR, "Division by zero")
+	return int_value(op1.val() // op2.val())
+
+def op_and(interp, op1, op2):
+	if op1.elem_type != op2.elem_type or op1.elem_type != InterpreterBase.BOOL_DEF:
+		type_mismatch(interp, "&&", op1, op2)
+	return bool_value(op1.val() and op2.val())
+
+def op_or(interp, op1, op2):
+	if op1.elem_type != op2.elem_type or op1.elem_type != InterpreterBase.BOOL_DEF:
+		type_mismatch(interp, "||", op1, op2)
+	return bool_value(op1.val() or op2.val())
+
+def op_lt(interp, op1, op2):
+	if op1.elem_type != op2.elem_type:
+		type_mismatch(interp, "<", op1, op2)
+	if op1.elem_type != InterpreterBase.INT_DEF:
+		not_comparable(interp, op1)
+	return bool_value(op1.val() < op2.val())
+
+def op_gt(interp, op1, op2):
+	if op1.elem_type != op2.elem_type:
+		type_mismatch(interp, ">", op1, op2)
+	if op1.elem_type != InterpreterBase.INT_DEF:
+		not_comparable(interp, op1)
+	return bool_value(op1.val() > op2.val())
+
+def op_le(interp, op1, op2):
+	if op1.elem_type != op2.elem_type:
+		type_mismatch(interp, "<=", op1, op2)
+	if op1.elem_type != InterpreterBase.INT_DEF:
+		not_comparable(interp, op1)
+	return bool_value(op1.val() <= op2.val())
+
+def op_ge(interp, op1, op2):
+	if op1.elem_type != op2.elem_type:
+		type_mismatch(interp, ">=", op1, op2)
+	if op1.elem_type != InterpreterBase.INT_DEF:
+		not_comparable(interp, op1)
+	return bool_value(op1.val() >= op2.val())
+
+
+# In short-circuit mode (see Interpreter(short_circuit=True)) && and || only
+# evaluate their right operand when the left one doesn't decide the result,
+# which is when it equals the value given here. Every operand that does get
+# evaluated is still checked to be a bool.
+short_circuit_results = {
+	"&&": False,
+	"||": True,
+}
+
+def check_logical_operand(interp, op, operand):
+	if operand.elem_type != InterpreterBase.BOOL_DEF:
+		unsupported_type(interp, op, operand)
+	return operand
+
+
+unary_operations = {
+	InterpreterBase.NOT_DEF: op_not,
+	InterpreterBase.NEG_DEF: op_neg,
+}
+
+binary_operations = {
+	"+": op_add,
+	"-": op_sub,
+	"*": op_mul,
+	"/": op_div,
+	"&&": op_and,
+	"||": op_or,
+	"==": op_eq,
+	"!=": op_ne,
+	"<": op_lt,
+	">": op_gt,
+	"<=": op_le,
+	">=": op_ge,
+}
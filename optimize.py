@@ -0,0 +1,88 @@
+from element import walk, Node, Literal, UnaryOp, BinOp, If
+from intbase import InterpreterBase
+from operations import unary_operations
+from operations import binary_operations
+from value import literal_value
+
+
+# Optional constant folding pass, run on the parsed program before resolution
+# (see Interpreter(optimize=True)). Operators whose operands are all literals are
+# replaced by a literal holding their result, and if statements whose condition
+# folds to a literal bool are replaced by the branch that would run.
+#
+# Nothing is folded that would raise: `1 / 0` or `1 + "a"` are left in place so
+# the error is still reported when (and if) that expression is evaluated.
+
+statement_lists = {"statements", "else_statements"}
+
+
+class FoldError(Exception):
+	pass
+
+
+# Stands in for the interpreter when an operation is applied at fold time
+class Folder:
+	def error(self, error_type, message):
+		raise FoldError(message)
+
+
+folder = Folder()
+
+
+def fold_constants(program_node):
+	# walk() yields parents before children, so going backwards every node's
+	# children are folded before the node itself is looked at
+	for node in reversed(list(walk(program_node))):
+		if not isinstance(node, Node):
+			continue
+		for field, value in node.items():
+			if isinstance(value, Node):
+				setattr(node, field, fold_expression(value))
+			elif isinstance(value, list):
+				if field in statement_lists:
+					setattr(node, field, fold_statements(value))
+				else:
+					setattr(node, field, [fold_expression(item) for item in value])
+
+
+def fold_expression(node):
+	if isinstance(node, UnaryOp) and isinstance(node.op1, Literal):
+		operands = [node.op1]
+		operation = unary_operations[node.elem_type]
+	elif isinstance(node, BinOp) and isinstance(node.op1, Literal) and isinstance(node.op2, Literal):
+		operands = [node.op1, node.op2]
+		operation = binary_operations[node.elem_type]
+	else:
+		return node
+
+	values = [literal_value(operand.elem_type, operand.val) for operand in operands]
+	try:
+		result = operation(folder, *values)
+	except FoldError:
+		return node
+	return Literal(result.elem_type, result.val())
+
+
+def fold_statements(statement_nodes):
+	statements = []
+	for statement_node in statement_nodes:
+		if not is_constant_if(statement_node):
+			statements.append(statement_node)
+			continue
+		if statement_node.condition.val:
+			branch = statement_node.statements
+		else:
+			branch = statement_node.else_statements
+		if not branch:
+			continue
+		# The branch runs in a frame of its own, so variables it creates go out of
+		# scope when it ends. Only splice it in if it doesn't assign anything directly.
+		if any(node.elem_type == "=" for node in branch):
+			statements.append(If(InterpreterBase.IF_DEF, Literal(InterpreterBase.BOOL_DEF, True), branch, None))
+		else:
+			statements.extend(branch)
+	return statements
+
+
+def is_constant_if(node):
+	return isinstance(node, If) and node.condition.elem_type == InterpreterBase.BOOL_DEF
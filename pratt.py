@@ -0,0 +1,270 @@
+from brewparse import precedence
+from element import Element, Func, Arg, Assign, If, While, Return, UnaryOp, BinOp, Literal, Nil, Var, Call
+from intbase import InterpreterBase
+
+
+# A hand-written parser for Brewin (see parse_program(parser="pratt")). It
+# accepts the same grammar as the yacc rules in brewparse.py and builds the
+# same trees, node for node, but reads tokens straight off the lexer instead
+# of going through PLY's parse tables and a p_* function per reduction.
+#
+# Statements are parsed by recursive descent. Expressions use precedence
+# climbing with explicit operand and operator stacks, driven by brewparse's
+# precedence table, so long operator chains, parentheses and prefix operators
+# nest without recursing. A syntax error raises ParseError with the token
+# yacc would have reported (None at end of input).
+
+# How tightly each binary operator binds, and which way it associates, by
+# its level in the precedence table
+binary_operators = {}
+for level, (assoc, *names) in enumerate(precedence):
+	for name in names:
+		binary_operators[name] = (level, assoc == "left")
+
+# The prefix operators, with the precedence of their rules: -x uses %prec UMINUS
+prefix_operators = {
+	"NOT": (InterpreterBase.NOT_DEF, binary_operators.pop("NOT")[0]),
+	"MINUS": (InterpreterBase.NEG_DEF, binary_operators.pop("UMINUS")[0]),
+}
+
+# Where a pending "(" sits on the operator stack
+OPEN = -1
+
+# The tokens a statement that isn't an assignment, if, while or return can start with
+expression_starts = frozenset(prefix_operators) | {"LPAREN", "NUMBER", "STRING", "TRUE", "FALSE", "NIL", "AT", "LAMBDA", "NAME"}
+
+
+class ParseError(Exception):
+	def __init__(self, token):
+		super().__init__(token)
+		self.token = token
+
+
+class Parser:
+	def __init__(self, lexer):
+		self.lexer = lexer
+		self.advance()
+
+	def advance(self):
+		self.token = self.lexer.token()
+		self.type = self.token.type if self.token is not None else None
+
+	def expect(self, type):
+		if self.type != type:
+			raise ParseError(self.token)
+		value = self.token.value
+		self.advance()
+		return value
+
+	def program(self):
+		functions = [self.function()]
+		while self.type is not None:
+			functions.append(self.function())
+		return Element(InterpreterBase.PROGRAM_DEF, functions=functions)
+
+	def function(self):
+		self.expect("FUNC")
+		name = self.expect("NAME")
+		args = self.formal_args()
+		return Func(InterpreterBase.FUNC_DEF, name=name, args=args, statements=self.block())
+
+	def formal_args(self):
+		self.expect("LPAREN")
+		args = []
+		if self.type == "RPAREN":
+			self.advance()
+			return args
+		while True:
+			if self.type == "REF":
+				self.advance()
+				args.append(Arg(InterpreterBase.REFARG_DEF, name=self.expect("NAME")))
+			else:
+				args.append(Arg(InterpreterBase.ARG_DEF, name=self.expect("NAME")))
+			if self.type != "COMMA":
+				break
+			self.advance()
+		self.expect("RPAREN")
+		return args
+
+	# { statement+ }
+	def block(self):
+		self.expect("LBRACE")
+		statements = [self.statement()]
+		while self.type != "RBRACE":
+			statements.append(self.statement())
+		self.advance()
+		return statements
+
+	def statement(self):
+		type = self.type
+		if type == "NAME":
+			# An assignment, or an expression starting with a variable or call
+			name = self.token.value
+			self.advance()
+			if self.type == "DOT":
+				self.advance()
+				member = self.expect("NAME")
+				if self.type == "ASSIGN":
+					self.advance()
+					return self.finish_assignment(name + "." + member)
+				first = self.member(name, member)
+			elif self.type == "ASSIGN":
+				self.advance()
+				return self.finish_assignment(name)
+			else:
+				first = self.name(name)
+			expression = self.expression(first)
+		elif type == "IF":
+			self.advance()
+			condition = self.condition()
+			statements = self.block()
+			else_statements = None
+			if self.type == "ELSE":
+				self.advance()
+				else_statements = self.block()
+			return If(InterpreterBase.IF_DEF, condition=condition, statements=statements, else_statements=else_statements)
+		elif type == "WHILE":
+			self.advance()
+			condition = self.condition()
+			return While(InterpreterBase.WHILE_DEF, condition=condition, statements=self.block())
+		elif type == "RETURN":
+			self.advance()
+			expression = None
+			if self.type != "SEMI":
+				expression = self.expression()
+			self.expect("SEMI")
+			return Return(InterpreterBase.RETURN_DEF, expression=expression)
+		elif type in expression_starts:
+			expression = self.expression()
+		else:
+			raise ParseError(self.token)
+		self.expect("SEMI")
+		return expression
+
+	def finish_assignment(self, name):
+		expression = self.expression()
+		self.expect("SEMI")
+		return Assign("=", name=name, expression=expression)
+
+	# ( expression )
+	def condition(self):
+		self.expect("LPAREN")
+		expression = self.expression()
+		self.expect("RPAREN")
+		return expression
+
+	# Parses an expression, continuing from first if the caller has already
+	# read its leading operand. Operators wait on the stack, as (level, kind,
+	# value) with the prefix operators' node types as their kind, until one
+	# that binds less tightly, or the end of the expression, reduces them.
+	def expression(self, first=None):
+		operands = []
+		operators = []
+		operand = first
+		while True:
+			if operand is None:
+				while True:
+					prefix = prefix_operators.get(self.type)
+					if prefix is not None:
+						operators.append((prefix[1], prefix[0], None))
+					elif self.type == "LPAREN":
+						operators.append((OPEN, None, None))
+					else:
+						break
+					self.advance()
+				operand = self.operand()
+			operands.append(operand)
+			operand = None
+
+			while True:
+				binary = binary_operators.get(self.type)
+				if binary is not None:
+					level, left = binary
+					while operators:
+						top = operators[-1][0]
+						if top < level or (top == level and not left):
+							break
+						self.reduce(operands, operators)
+					operators.append((level, BinOp, self.token.value))
+					self.advance()
+					break
+				# Close the innermost "(", if this expression has one open;
+				# otherwise the token ends the expression
+				while operators and operators[-1][0] != OPEN:
+					self.reduce(operands, operators)
+				if operators:
+					if self.type != "RPAREN":
+						raise ParseError(self.token)
+					operators.pop()
+					self.advance()
+					continue
+				return operands[0]
+
+	def reduce(self, operands, operators):
+		_, kind, value = operators.pop()
+		if kind is BinOp:
+			op2 = operands.pop()
+			operands[-1] = BinOp(value, op1=operands[-1], op2=op2)
+		else:
+			operands[-1] = UnaryOp(kind, op1=operands[-1])
+
+	def operand(self):
+		token = self.token
+		type = self.type
+		if type == "NAME":
+			self.advance()
+			if self.type == "DOT":
+				self.advance()
+				return self.member(token.value, self.expect("NAME"))
+			return self.name(token.value)
+		if type == "NUMBER":
+			self.advance()
+			return Literal(InterpreterBase.INT_DEF, val=token.value)
+		if type == "STRING":
+			self.advance()
+			return Literal(InterpreterBase.STRING_DEF, val=token.value)
+		if type == "TRUE" or type == "FALSE":
+			self.advance()
+			return Literal(InterpreterBase.BOOL_DEF, val=token.value == InterpreterBase.TRUE_DEF)
+		if type == "NIL":
+			self.advance()
+			return Nil(InterpreterBase.NIL_DEF)
+		if type == "AT":
+			self.advance()
+			return Element(InterpreterBase.OBJ_DEF)
+		if type == "LAMBDA":
+			self.advance()
+			args = self.formal_args()
+			return Element(InterpreterBase.LAMBDA_DEF, args=args, statements=self.block())
+		raise ParseError(token)
+
+	# A variable or function call, after its name
+	def name(self, name):
+		if self.type == "LPAREN":
+			return Call(InterpreterBase.FCALL_DEF, name=name, args=self.args())
+		return Var(InterpreterBase.VAR_DEF, name=name)
+
+	# A member or method call, after objref.name
+	def member(self, objref, name):
+		if self.type == "LPAREN":
+			return Element(InterpreterBase.MCALL_DEF, objref=objref, name=name, args=self.args())
+		return Var(InterpreterBase.VAR_DEF, name=objref + "." + name)
+
+	# ( expression, ... )
+	def args(self):
+		self.advance()
+		args = []
+		if self.type == "RPAREN":
+			self.advance()
+			return args
+		args.append(self.expression())
+		while self.type == "COMMA":
+			self.advance()
+			args.append(self.expression())
+		self.expect("RPAREN")
+		return args
+
+
+# The program's AST, from a lexer that has been given its source
+def parse(lexer):
+	return Parser(lexer).program()
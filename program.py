@@ -0,0 +1,39 @@
+from types import MappingProxyType
+
+
+# A compiled program (see Interpreter.compile), run with Interpreter.execute.
+# It holds everything that stays the same from one run to the next: the
+# resolved AST, the function table, the results of the analysis passes, the
+# backend's compiled code, and the options and natives those were built with.
+# Every call site that can be resolved is resolved when the program is
+# compiled, so nothing writes to a Program or its nodes once it is built, and
+# one Program can be executed any number of times by any Interpreter with the
+# same options, from several threads at once.
+#
+# quicken=True is the exception: its type feedback lives on the operator nodes
+# (see quicken.py), so it is shared by every run of the Program, and two
+# threads running one with quicken=True can race on it.
+
+class Program:
+	__slots__ = ("ast", "functions", "natives", "variable_names", "options", "functions_epoch", "pure_functions", "compiled")
+
+	# compiled is the backend's compiled form of the program: the closures.py
+	# function table, a bytecode.Bytecode, the transpile.py function table, or
+	# None for the tree-walker
+	def __init__(self, ast, functions, natives, variable_names, options, pure_functions, compiled):
+		set = object.__setattr__
+		set(self, "ast", ast)
+		set(self, "functions", MappingProxyType(functions))
+		set(self, "natives", MappingProxyType(dict(natives)))
+		set(self, "variable_names", tuple(variable_names))
+		set(self, "options", options)
+		# What call sites resolved against this function table are marked with
+		set(self, "functions_epoch", object())
+		set(self, "pure_functions", MappingProxyType(pure_functions))
+		set(self, "compiled", compiled)
+
+	def __setattr__(self, name, value):
+		raise AttributeError("Program is immutable")
+
+	def __delattr__(self, name):
+		raise AttributeError("Program is immutable")
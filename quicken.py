@@ -0,0 +1,92 @@
+from element import walk, BinOp
+from intbase import InterpreterBase
+from operations import binary_operations
+from value import int_value, bool_value, string_value
+
+
+# Type-feedback quickening of binary operators (see Interpreter(quicken=True)).
+# The first time the tree-walker evaluates an operator node whose operands have
+# the same type, the node is rewritten to use the fast path for that operator
+# and type below, guarded by a check of both operand types. When an operand of
+# another type shows up the node deoptimizes: it goes back to the generic
+# operation in operations.py, which reports any error exactly as before, and
+# stays there.
+#
+# Fast paths take the same arguments as the generic operations and assume both
+# operands have the node's type.
+
+INT = InterpreterBase.INT_DEF
+STRING = InterpreterBase.STRING_DEF
+BOOL = InterpreterBase.BOOL_DEF
+
+
+def int_div(interp, op1, op2):
+	if op2.v == 0:
+		return binary_operations["/"](interp, op1, op2)
+	return int_value(op1.v // op2.v)
+
+
+def same_eq(interp, op1, op2):
+	return bool_value(op1.v == op2.v)
+
+def same_ne(interp, op1, op2):
+	return bool_value(op1.v != op2.v)
+
+
+quickened_operations = {
+	("+", INT): lambda interp, op1, op2: int_value(op1.v + op2.v),
+	("-", INT): lambda interp, op1, op2: int_value(op1.v - op2.v),
+	("*", INT): lambda interp, op1, op2: int_value(op1.v * op2.v),
+	("/", INT): int_div,
+	("<", INT): lambda interp, op1, op2: bool_value(op1.v < op2.v),
+	(">", INT): lambda interp, op1, op2: bool_value(op1.v > op2.v),
+	("<=", INT): lambda interp, op1, op2: bool_value(op1.v <= op2.v),
+	(">=", INT): lambda interp, op1, op2: bool_value(op1.v >= op2.v),
+	("==", INT): same_eq,
+	("!=", INT): same_ne,
+	("+", STRING): lambda interp, op1, op2: string_value(op1.v + op2.v),
+	("==", STRING): same_eq,
+	("!=", STRING): same_ne,
+	("&&", BOOL): lambda interp, op1, op2: bool_value(op1.v and op2.v),
+	("||", BOOL): lambda interp, op1, op2: bool_value(op1.v or op2.v),
+	("==", BOOL): same_eq,
+	("!=", BOOL): same_ne,
+}
+
+
+# Evaluates node's operator on op1 and op2, updating its type feedback
+def evaluate_binary(interp, node, op1, op2):
+	quick = node.quick
+	if quick is not None:
+		if op1.elem_type == node.quick_type and op2.elem_type == node.quick_type:
+			node.hits += 1
+			return quick(interp, op1, op2)
+		node.quick = None
+		node.deopts += 1
+	elif node.deopts == 0 and op1.elem_type == op2.elem_type:
+		quick = quickened_operations.get((node.elem_type, op1.elem_type))
+		if quick is not None:
+			node.quick = quick
+			node.quick_type = op1.elem_type
+			node.hits += 1
+			return quick(interp, op1, op2)
+	node.misses += 1
+	return binary_operations[node.elem_type](interp, op1, op2)
+
+
+# (operator, specialized type or None, hits, misses, deopts) for every operator
+# node in the program that has been evaluated
+def quickening_stats(program_node):
+	stats = []
+	for node in walk(program_node):
+		if isinstance(node, BinOp) and node.hits + node.misses:
+			stats.append((node.elem_type, node.quick_type if node.quick is not None else None, node.hits, node.misses, node.deopts))
+	return stats
+
+
+def quickening_report(program_node):
+	lines = []
+	for op, quick_type, hits, misses, deopts in quickening_stats(program_node):
+		state = "{} fast path".format(quick_type) if quick_type is not None else "generic"
+		lines.append("'{}' ({}): {} hits, {} misses, {} deopts".format(op, state, hits, misses, deopts))
+	return lines
@@ -0,0 +1,69 @@
+from element import walk, Literal, If, While, UnaryOp, BinOp, Call
+from intbase import InterpreterBase
+from value import literal_value
+
+
+# Resolution pass, run once after parsing. Every variable reference, assignment
+# and formal argument gets a slot number in node.slot, shared by all uses of the
+# same name, and the returned list maps slots back to names. Literal nodes get
+# their Value built once, in node.value.
+#
+# Brewin scopes are dynamic (a callee sees its caller's frames), so which frame
+# a name lives in can't be known statically. Instead the Environment keeps one
+# stack of bindings per slot, which makes reads and writes a single index
+# operation while keeping the innermost-frame-wins lookup of the old frame scan.
+#
+# A variable can only be bound in an if or while block's own frame by an
+# assignment directly in that block (nested blocks and calls push frames of
+# their own), so blocks without one are marked as not scoped and run without
+# pushing a frame.
+#
+# Operators more than DEEP_EXPRESSION levels above the bottom of their
+# expression (counting calls, whose arguments are evaluated on the same Python
+# stack) get node.deep, and the tree-walker evaluates them with an explicit
+# stack instead of recursing (see Interpreter.evaluate_deep).
+
+DEEP_EXPRESSION = 100
+
+variable_nodes = {InterpreterBase.VAR_DEF, "=", InterpreterBase.ARG_DEF, InterpreterBase.REFARG_DEF}
+
+
+def resolve(program_node):
+	slots = {}
+	for node in walk(program_node):
+		if isinstance(node, Literal):
+			node.value = literal_value(node.elem_type, node.val)
+		elif node.elem_type in variable_nodes:
+			name = node.get("name")
+			if name not in slots:
+				slots[name] = len(slots)
+			node.slot = slots[name]
+		elif isinstance(node, If):
+			node.scoped = assigns(node.statements)
+			node.else_scoped = assigns(node.else_statements)
+		elif isinstance(node, While):
+			node.scoped = assigns(node.statements)
+	mark_deep(program_node)
+	return list(slots)
+
+
+def mark_deep(program_node):
+	heights = {}
+	# walk() yields parents before children, so going backwards every node's
+	# operands have their heights before the node itself
+	for node in reversed(list(walk(program_node))):
+		if isinstance(node, UnaryOp):
+			height = heights.get(node.op1, 0) + 1
+		elif isinstance(node, BinOp):
+			height = max(heights.get(node.op1, 0), heights.get(node.op2, 0)) + 1
+		elif isinstance(node, Call):
+			heights[node] = max((heights.get(arg_node, 0) for arg_node in node.args), default=0) + 1
+			continue
+		else:
+			continue
+		heights[node] = height
+		node.deep = height > DEEP_EXPRESSION
+
+
+def assigns(statement_nodes):
+	return statement_nodes is not None and any(node.elem_type == "=" for node in statement_nodes)
@@ -0,0 +1,98 @@
+import re
+
+import brewlex
+
+
+# A hand-written scanner for Brewin (see parse_program(lexer="scanner")),
+# producing the same tokens as the PLY lexer built from brewlex.py: the same
+# types, values, line numbers and positions, and the same "Illegal character"
+# messages. Instead of PLY's master regex and per-token callbacks, every rule
+# is a named group of one compiled regex, and tokens are plain slotted objects.
+#
+# The regex is built from brewlex.py's own rules, in PLY's order: the function
+# rules in the order they're defined, then the string rules, longest regex
+# first. Literals that no rule matches come last.
+
+# brewlex.py's function rules; what each one does to its token is in Scanner.generate
+function_rules = ["NUMBER", "NAME", "newline", "comment", "STRING"]
+
+
+def build_pattern():
+	rules = [(name, getattr(brewlex, "t_" + name).__doc__) for name in function_rules]
+	string_rules = [(name[2:], value) for name, value in vars(brewlex).items() if name.startswith("t_") and isinstance(value, str) and name != "t_ignore"]
+	rules += sorted(string_rules, key=lambda rule: len(rule[1]), reverse=True)
+	groups = ["(?P<{}>{})".format(name, regex) for name, regex in rules]
+	groups.append("(?P<literal>[{}])".format(re.escape("".join(brewlex.literals))))
+	# PLY compiles its master regex in verbose mode too
+	return re.compile("|".join(groups), re.VERBOSE)
+
+
+pattern = build_pattern()
+
+
+# The same attributes as PLY's LexToken
+class Token:
+	__slots__ = ("type", "value", "lineno", "lexpos", "lexer")
+
+	def __init__(self, type, value, lineno, lexpos):
+		self.type = type
+		self.value = value
+		self.lineno = lineno
+		self.lexpos = lexpos
+
+	def __repr__(self):
+		return "LexToken({},{!r},{},{})".format(self.type, self.value, self.lineno, self.lexpos)
+
+
+# The interface yacc's parser needs from a lexer: input() then token() until None
+class Scanner:
+	def __init__(self):
+		self.lineno = 1
+		self.tokens = iter(())
+
+	def input(self, data):
+		self.tokens = self.generate(data)
+
+	def token(self):
+		return next(self.tokens, None)
+
+	def generate(self, data):
+		match = pattern.match
+		reserved_map = brewlex.reserved_map
+		ignore = brewlex.t_ignore
+		pos = 0
+		end = len(data)
+		while pos < end:
+			if data[pos] in ignore:
+				pos += 1
+				continue
+			m = match(data, pos)
+			if m is None:
+				print(f"Illegal character {data[pos]}")
+				pos += 1
+				continue
+			kind = m.lastgroup
+			value = m.group()
+			if kind == "NAME":
+				yield Token(reserved_map.get(value, "NAME"), value, self.lineno, pos)
+			elif kind == "NUMBER":
+				yield Token("NUMBER", int(value), self.lineno, pos)
+			elif kind == "newline":
+				self.lineno += len(value)
+			elif kind == "comment":
+				# As in brewlex.t_comment, the regex only matches the /*
+				close = data.find("*/", pos + 2)
+				if close == -1:
+					brewlex.unterminated("comment", self.lineno)
+				self.lineno += data.count("\n", pos, close)
+				pos = close + 2
+				continue
+			elif kind == "STRING":
+				if len(value) < 2 or value[-1] != '"':
+					brewlex.unterminated("string", self.lineno)
+				yield Token("STRING", value[1:-1], self.lineno, pos)
+			elif kind == "literal":
+				yield Token(value, value, self.lineno, pos)
+			else:
+				yield Token(kind, value, self.lineno, pos)
+			pos = m.end()
@@ -0,0 +1,125 @@
+import time
+from types import FunctionType
+
+from element import Call
+from value import NIL
+import transpile
+
+
+# Tiered execution (see Interpreter(backend="tiered")). Every function starts
+# out on the tree-walker, which counts its calls and the back-edges of its while
+# loops. Once that count reaches the threshold the function is promoted: it is
+# transpiled to Python (see transpile.py), and every later call to it, from
+# either tier, runs the compiled version. A call already running when its
+# function is promoted stays on the tree-walker, except that a while loop in it
+# switches to compiled code at its next back-edge (see run_while).
+#
+# Compiled code calls other functions through `compiled`, which holds either
+# their compiled version or a wrapper that runs them on the tree-walker.
+
+class Tiering:
+	def __init__(self, interp, functions, natives, threshold):
+		self.interp = interp
+		self.functions = functions
+		self.natives = natives
+		self.threshold = threshold
+		self.keys = {function_node: key for key, function_node in functions.items()}
+		self.counts = dict.fromkeys(functions.values(), 0)
+		self.compiled = {key: self.tree_function(function_node) for key, function_node in functions.items()}
+		self.promoted = {}
+		# Compiled versions of while loops in promoted functions, None if they can't be
+		self.loops = {}
+		self.current = None
+		# (function key, count, seconds into the run, whether it could be compiled)
+		self.events = []
+		self.tier_times = {"tree": 0.0, "compiled": 0.0}
+		self.tier = "tree"
+		self.start = self.since = time.perf_counter()
+
+	# Counts a call to, or a loop back-edge in, function_node
+	def count(self, function_node):
+		count = self.counts[function_node] + 1
+		self.counts[function_node] = count
+		if count == self.threshold:
+			self.promote(function_node)
+
+	def promote(self, function_node):
+		key = self.keys[function_node]
+		now = time.perf_counter()
+		try:
+			function = transpile.FunctionTranspiler(function_node, self.functions, self.interp.short_circuit, self.natives).build(self.compiled)
+		except transpile.untranspilable:
+			function = None
+		self.events.append((key, self.counts[function_node], now - self.start, function is not None))
+		if function is not None:
+			self.promoted[function_node] = function
+			self.compiled[key] = function
+
+	# Makes tier the current one, charging the time since the last switch to
+	# the previous one, which is returned
+	def switch(self, tier):
+		now = time.perf_counter()
+		self.tier_times[self.tier] += now - self.since
+		self.since = now
+		previous = self.tier
+		self.tier = tier
+		return previous
+
+	# Runs a promoted function, and the tail calls it makes, in the frame that
+	# run_user_function pushed for it
+	def run_compiled(self, function):
+		previous = self.switch("compiled")
+		ret = function(self.interp)
+		while type(ret) is FunctionType:
+			ret = ret(self.interp)
+		self.switch(previous)
+		return ret
+
+	# The compiled version of while_node, in the current function, or None
+	def compiled_loop(self, while_node):
+		if while_node not in self.loops:
+			function_node = self.current
+			try:
+				loop = transpile.FunctionTranspiler(function_node, self.functions, self.interp.short_circuit, self.natives).build_loop(while_node, self.compiled)
+			except transpile.untranspilable:
+				loop = None
+			self.loops[while_node] = loop
+			self.events.append(("{} while loop".format(self.keys[function_node]), self.counts[function_node], time.perf_counter() - self.start, loop is not None))
+		return self.loops[while_node]
+
+	# What compiled code calls for a function that hasn't been promoted
+	def tree_function(self, function_node):
+		statements = function_node.statements
+		def run_tree(interp):
+			self.count(function_node)
+			previous_tier = self.switch("tree")
+			previous_function = self.current
+			self.current = function_node
+			for statement_node in statements:
+				ret = interp.run_statement(statement_node)
+				if ret is not None:
+					break
+			else:
+				ret = NIL
+			if type(ret) is Call:
+				# A tail call, made the way compiled code makes them
+				env = interp.env
+				env.push_frame()
+				for arg, arg_node in zip(ret.call_target.args, ret.args):
+					env.bind(arg.slot, interp.evaluate_expression(arg_node))
+				ret = self.compiled["{}-{}".format(ret.name, len(ret.args))]
+			self.current = previous_function
+			self.switch(previous_tier)
+			return ret
+		return run_tree
+
+	def stop(self):
+		self.switch(self.tier)
+
+	def report(self):
+		lines = []
+		for key, count, seconds, compiled in self.events:
+			outcome = "promoted" if compiled else "not compilable"
+			lines.append("{}: {} after {} calls and back-edges, {:.2f} ms in".format(key, outcome, count, seconds * 1000))
+		lines.append("tree: {:.2f} ms, compiled: {:.2f} ms".format(self.tier_times["tree"] * 1000, self.tier_times["compiled"] * 1000))
+		return lines
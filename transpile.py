@@ -0,0 +1,409 @@
+import threading
+from collections import OrderedDict
+from types import FunctionType
+
+from element import Call
+from intbase import InterpreterBase
+from intbase import ErrorType
+from operations import unary_operations
+from operations import binary_operations
+from operations import short_circuit_results, check_logical_operand
+from value import int_value, string_value, TRUE, FALSE, NIL
+
+
+# Python backend. Each function is turned into the source of a Python function,
+# compiled with compile() and run directly, so a Brewin call is a Python call
+# and expressions become straight-line Python statements on temporaries.
+# Variables still live in the Environment (scoping is dynamic), addressed by the
+# slots from resolver.py.
+#
+# Operators get an inline fast path for the common operand types and otherwise
+# call the shared implementation in operations.py, so type checks and error
+# messages are the same as on the other backends.
+#
+# A Brewin call returns the callee's Value. `return f(...)` to a user function
+# binds f's arguments in a new frame and returns f's Python function instead,
+# which finish_call keeps running until it gets a Value.
+#
+# Functions using anything the transpiler doesn't handle (lambdas, objects,
+# method calls, expressions marked deep by resolver.py, blocks nested too
+# deeply for Python) run on the tree-walker instead.
+
+class Unsupported(Exception):
+	pass
+
+
+# What building a function raises when it has to run on the tree-walker
+# instead: Unsupported, or, for blocks nested deeper than the transpiler's
+# recursion or Python's compiler allow, RecursionError or SyntaxError (such as
+# "too many statically nested blocks", or IndentationError)
+untranspilable = (Unsupported, SyntaxError, RecursionError)
+
+
+# Compiled code objects by generated source, shared by every run, keeping the
+# CODE_CACHE_SIZE most recently used so that a long-lived process compiling
+# many programs doesn't grow without bound
+CODE_CACHE_SIZE = 1024
+code_cache = OrderedDict()
+code_cache_lock = threading.Lock()
+
+literal_types = {InterpreterBase.INT_DEF, InterpreterBase.STRING_DEF, InterpreterBase.BOOL_DEF, InterpreterBase.NIL_DEF}
+int_fast_paths = {"+": "+", "-": "-", "*": "*"}
+comparison_fast_paths = {"<": "<", ">": ">", "<=": "<=", ">=": ">="}
+
+
+def begin_call(interp):
+	interp.recursion_depth += 1
+	if interp.recursion_depth > interp.max_call_depth:
+		interp.error(ErrorType.FAULT_ERROR, "Recursion depth exceeded")
+	env = interp.env
+	base = env.depth()
+	env.push_frame()
+	return base
+
+
+# Runs function, and any tail calls it makes, in the frame begin_call pushed
+def finish_call(interp, base, function):
+	ret = function(interp)
+	while type(ret) is FunctionType:
+		ret = ret(interp)
+	interp.env.pop_frames_to(base)
+	interp.recursion_depth -= 1
+	return ret
+
+
+def unknown_variable(interp, name):
+	interp.error(ErrorType.NAME_ERROR, "Unknown variable: {}".format(name))
+
+
+def bad_condition(interp, kind, condition):
+	interp.error(ErrorType.TYPE_ERROR, "Type mismatch on {} condition: {}".format(kind, condition.elem_type))
+
+
+# What generated code can refer to by name, besides its constants and functions
+runtime = {
+	"INT": InterpreterBase.INT_DEF,
+	"BOOL": InterpreterBase.BOOL_DEF,
+	"TRUE": TRUE,
+	"FALSE": FALSE,
+	"NIL": NIL,
+	"ErrorType": ErrorType,
+	"int_value": int_value,
+	"string_value": string_value,
+	"begin_call": begin_call,
+	"finish_call": finish_call,
+	"unknown_variable": unknown_variable,
+	"bad_condition": bad_condition,
+	"check_logical_operand": check_logical_operand,
+}
+for operation in list(unary_operations.values()) + list(binary_operations.values()):
+	runtime[operation.__name__] = operation
+
+
+# Returns {function key: Python function} for the function table built by Interpreter.run
+def transpile_functions(functions, short_circuit=False, natives={}):
+	compiled = {}
+	for key, function_node in functions.items():
+		try:
+			compiled[key] = FunctionTranspiler(function_node, functions, short_circuit, natives).build(compiled)
+		except untranspilable:
+			compiled[key] = tree_function(function_node, compiled)
+	return compiled
+
+
+def run_main(interp):
+	base = begin_call(interp)
+	return finish_call(interp, base, interp.python_functions["main-0"])
+
+
+# Runs function_node's statements on the tree-walker, as run_user_function would
+def tree_function(function_node, compiled):
+	statements = function_node.statements
+	def run_tree(interp):
+		for statement_node in statements:
+			ret = interp.run_statement(statement_node)
+			if ret is None:
+				continue
+			if type(ret) is Call:
+				env = interp.env
+				env.push_frame()
+				for arg, arg_node in zip(ret.call_target.args, ret.args):
+					env.bind(arg.slot, interp.evaluate_expression(arg_node))
+				return compiled["{}-{}".format(ret.name, len(ret.args))]
+			return ret
+		return NIL
+	return run_tree
+
+
+def cached_compile(source, filename):
+	with code_cache_lock:
+		code = code_cache.get(source)
+		if code is not None:
+			code_cache.move_to_end(source)
+			return code
+	code = compile(source, filename, "exec")
+	with code_cache_lock:
+		code_cache[source] = code
+		if len(code_cache) > CODE_CACHE_SIZE:
+			code_cache.popitem(last=False)
+	return code
+
+
+class FunctionTranspiler:
+	def __init__(self, function_node, functions, short_circuit, natives):
+		self.function_node = function_node
+		self.functions = functions
+		self.short_circuit = short_circuit
+		self.natives = natives
+		self.lines = []
+		self.indent = 2
+		self.temp_count = 0
+		self.consts = []
+		self.slots = set()
+
+	# The Python function for function_node, calling the others through `compiled`
+	def build(self, compiled):
+		self.compile_statements(self.function_node.statements)
+		self.emit("return NIL")
+		return self.make(compiled)
+
+	# A Python function that picks up while_node (in function_node) where the
+	# tree-walker leaves it at the end of an iteration, in the loop's frame. It
+	# returns None once the loop is done and its frame popped, and otherwise
+	# what the function returned from inside the loop.
+	def build_loop(self, while_node, compiled):
+		condition = self.temp()
+		self.emit("{} = {}".format(condition, self.compile_expression(while_node.condition)))
+		self.compile_loop(while_node, condition)
+		if while_node.scoped:
+			self.emit("env.pop_frame()")
+		self.emit("return None")
+		return self.make(compiled)
+
+	def make(self, compiled):
+		code = cached_compile(self.source(), "<brewin {}>".format(self.function_node.name))
+		namespace = dict(runtime)
+		exec(code, namespace)
+		return namespace["make"](self.consts, compiled)
+
+	def source(self):
+		header = ["def make(consts, functions):"]
+		header += ["\tc{} = consts[{}]".format(i, i) for i in range(len(self.consts))]
+		header.append("\tdef brewin_{}(interp):".format(self.function_node.name))
+		header += ["\t\tenv = interp.env", "\t\tbindings = env.bindings", "\t\tframes = env.frames"]
+		header += ["\t\tb{} = bindings[{}]".format(slot, slot) for slot in sorted(self.slots)]
+		footer = ["\treturn brewin_{}".format(self.function_node.name)]
+		return "\n".join(header + self.lines + footer) + "\n"
+
+	def emit(self, line):
+		self.lines.append("\t" * self.indent + line)
+
+	def temp(self):
+		self.temp_count += 1
+		return "t{}".format(self.temp_count)
+
+	def const(self, value):
+		self.consts.append(value)
+		return "c{}".format(len(self.consts) - 1)
+
+	def binding(self, slot):
+		self.slots.add(slot)
+		return "b{}".format(slot)
+
+	def compile_statements(self, statement_nodes):
+		for statement_node in statement_nodes:
+			self.compile_statement(statement_node)
+
+	def compile_statement(self, statement_node):
+		match statement_node.elem_type:
+			case "=":
+				self.compile_assignment(statement_node)
+			case InterpreterBase.FCALL_DEF:
+				self.compile_call(statement_node)
+			case InterpreterBase.RETURN_DEF:
+				self.compile_return(statement_node)
+			case InterpreterBase.IF_DEF:
+				self.compile_if(statement_node)
+			case InterpreterBase.WHILE_DEF:
+				self.compile_while(statement_node)
+		# Any other expression statement is never evaluated
+
+	def compile_assignment(self, statement_node):
+		value = self.compile_expression(statement_node.expression)
+		binding = self.binding(statement_node.slot)
+		self.emit("if {}:".format(binding))
+		self.emit("\t{}[-1] = {}".format(binding, value))
+		self.emit("else:")
+		self.emit("\t{}.append({})".format(binding, value))
+		self.emit("\tframes[-1].append({})".format(statement_node.slot))
+
+	def compile_return(self, statement_node):
+		expression_node = statement_node.expression
+		if expression_node is None:
+			self.emit("return NIL")
+		elif expression_node.elem_type == InterpreterBase.FCALL_DEF and expression_node.name not in builtin_calls and self.function_key(expression_node) in self.functions and self.function_key(expression_node) not in self.natives:
+			self.emit("env.push_frame()")
+			self.bind_args(expression_node)
+			self.emit("return functions[{!r}]".format(self.function_key(expression_node)))
+		else:
+			self.emit("return {}".format(self.compile_expression(expression_node)))
+
+	def compile_if(self, if_node):
+		condition = self.compile_expression(if_node.condition)
+		self.emit("if {}.elem_type != BOOL:".format(condition))
+		self.emit("\tbad_condition(interp, 'if', {})".format(condition))
+		self.emit("if {}.v:".format(condition))
+		self.compile_block(if_node.statements, if_node.scoped)
+		if if_node.else_statements is not None:
+			self.emit("else:")
+			self.compile_block(if_node.else_statements, if_node.else_scoped)
+
+	# Like the tree-walker, the condition is only type checked on entry, and is
+	# re-evaluated inside the loop's frame
+	def compile_while(self, while_node):
+		condition = self.temp()
+		self.emit("{} = {}".format(condition, self.compile_expression(while_node.condition)))
+		self.emit("if {}.elem_type != BOOL:".format(condition))
+		self.emit("\tbad_condition(interp, 'while', {})".format(condition))
+		if while_node.scoped:
+			self.emit("env.push_frame()")
+		self.compile_loop(while_node, condition)
+		if while_node.scoped:
+			self.emit("env.pop_frame()")
+
+	def compile_loop(self, while_node, condition):
+		self.emit("while {}.v:".format(condition))
+		self.indent += 1
+		self.compile_statements(while_node.statements)
+		self.emit("{} = {}".format(condition, self.compile_expression(while_node.condition)))
+		self.indent -= 1
+
+	def compile_block(self, statement_nodes, scoped):
+		self.indent += 1
+		if scoped:
+			self.emit("env.push_frame()")
+		start = len(self.lines)
+		self.compile_statements(statement_nodes)
+		if len(self.lines) == start:
+			self.emit("pass")
+		if scoped:
+			self.emit("env.pop_frame()")
+		self.indent -= 1
+
+	# Emits the statements computing expression_node, and returns the name of
+	# the temporary holding its Value
+	def compile_expression(self, expression_node):
+		elem_type = expression_node.elem_type
+		if elem_type == InterpreterBase.FCALL_DEF:
+			return self.compile_call(expression_node)
+		if elem_type == InterpreterBase.VAR_DEF:
+			binding = self.binding(expression_node.slot)
+			result = self.temp()
+			self.emit("{} = {}[-1] if {} else unknown_variable(interp, {!r})".format(result, binding, binding, expression_node.name))
+			return result
+		if elem_type in literal_types:
+			return self.const(expression_node.value)
+		if (elem_type in unary_operations or elem_type in binary_operations) and expression_node.deep:
+			# Left to the tree-walker, which evaluates it without recursing
+			raise Unsupported("deep expression")
+		if elem_type in unary_operations:
+			return self.compile_unary(elem_type, self.compile_expression(expression_node.op1))
+		if elem_type in short_circuit_results and self.short_circuit:
+			return self.compile_logical(expression_node)
+		if elem_type in binary_operations:
+			op1 = self.compile_expression(expression_node.op1)
+			op2 = self.compile_expression(expression_node.op2)
+			return self.compile_binary(elem_type, op1, op2)
+		raise Unsupported(elem_type)
+
+	def compile_unary(self, op, operand):
+		result = self.temp()
+		name = unary_operations[op].__name__
+		if op == InterpreterBase.NOT_DEF:
+			self.emit("{} = (FALSE if {}.v else TRUE) if {}.elem_type == BOOL else {}(interp, {})".format(result, operand, operand, name, operand))
+		else:
+			self.emit("{} = int_value(-{}.v) if {}.elem_type == INT else {}(interp, {})".format(result, operand, operand, name, operand))
+		return result
+
+	def compile_binary(self, op, op1, op2):
+		result = self.temp()
+		name = binary_operations[op].__name__
+		generic = "{}(interp, {}, {})".format(name, op1, op2)
+		both_ints = "{}.elem_type == INT and {}.elem_type == INT".format(op1, op2)
+		if op in int_fast_paths:
+			self.emit("{} = int_value({}.v {} {}.v) if {} else {}".format(result, op1, int_fast_paths[op], op2, both_ints, generic))
+		elif op == "/":
+			self.emit("{} = int_value({}.v // {}.v) if {} and {}.v != 0 else {}".format(result, op1, op2, both_ints, op2, generic))
+		elif op in comparison_fast_paths:
+			self.emit("{} = (TRUE if {}.v {} {}.v else FALSE) if {} else {}".format(result, op1, comparison_fast_paths[op], op2, both_ints, generic))
+		else:
+			self.emit("{} = {}".format(result, generic))
+		return result
+
+	def compile_logical(self, expression_node):
+		op = expression_node.elem_type
+		result = self.temp()
+		op1 = self.compile_expression(expression_node.op1)
+		self.emit("{} = check_logical_operand(interp, {!r}, {})".format(result, op, op1))
+		self.emit("if {}.v != {}:".format(result, short_circuit_results[op]))
+		self.indent += 1
+		op2 = self.compile_expression(expression_node.op2)
+		self.emit("{} = check_logical_operand(interp, {!r}, {})".format(result, op, op2))
+		self.indent -= 1
+		return result
+
+	def compile_call(self, call_node):
+		f_name = call_node.name
+		result = self.temp()
+		if f_name in builtin_calls:
+			builtin_calls[f_name](self, call_node, result)
+			return result
+
+		key = self.function_key(call_node)
+		if key in self.natives:
+			# Arguments are evaluated in the caller's scope, as for print
+			args = [self.compile_expression(arg_node) for arg_node in call_node.args]
+			self.emit("{} = {}(interp, [{}])".format(result, self.const(self.natives[key].handler), ", ".join(args)))
+			return result
+		if key not in self.functions:
+			self.emit("interp.error(ErrorType.NAME_ERROR, {!r})".format("Unknown Function Referenced: {}, taking {} args".format(f_name, len(call_node.args))))
+			return result
+		base = self.temp()
+		self.emit("{} = begin_call(interp)".format(base))
+		# Arguments are evaluated with the callee's frame already pushed, as in run_function
+		self.bind_args(call_node)
+		self.emit("{} = finish_call(interp, {}, functions[{!r}])".format(result, base, key))
+		return result
+
+	def bind_args(self, call_node):
+		function_node = self.functions[self.function_key(call_node)]
+		for arg, arg_node in zip(function_node.args, call_node.args):
+			self.emit("env.bind({}, {})".format(arg.slot, self.compile_expression(arg_node)))
+
+	def compile_input(self, call_node, result, convert):
+		if len(call_node.args) > 1:
+			self.emit("interp.error(ErrorType.NAME_ERROR, {!r})".format(f"No {call_node.name}() function found that takes > 1 parameter"))
+			return
+		if call_node.args:
+			self.emit("interp.output({}.v)".format(self.compile_expression(call_node.args[0])))
+		self.emit("{} = {}".format(result, convert))
+
+	def compile_inputi(self, call_node, result):
+		self.compile_input(call_node, result, "int_value(int(interp.get_input()))")
+
+	def compile_inputs(self, call_node, result):
+		self.compile_input(call_node, result, "string_value(str(interp.get_input()))")
+
+	def compile_print(self, call_node, result):
+		args = [self.compile_expression(arg_node) for arg_node in call_node.args]
+		self.emit("{} = interp.print_values([{}])".format(result, ", ".join(args)))
+
+	def function_key(self, call_node):
+		return "{}-{}".format(call_node.name, len(call_node.args))
+
+
+builtin_calls = {
+	"inputi": FunctionTranspiler.compile_inputi,
+	"inputs": FunctionTranspiler.compile_inputs,
+	"print": FunctionTranspiler.compile_print,
+}
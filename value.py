@@ -0,0 +1,86 @@
+from enum import Enum
+
+from intbase import InterpreterBase
+
+
+# Enumerated type for our different language data types
+# class Type(Enum):
+# 	INT = 1
+# 	BOOL = 2
+# 	STRING = 3
+# 	NIL = 4
+
+
+# Represents a value, which has a type and its value. Values are immutable, so
+# a single instance can be shared freely: literal nodes carry a pre-built one,
+# and true, false, nil and small ints each have a single canonical instance.
+class Value:
+	__slots__ = ("elem_type", "v")
+
+	def __init__(self, type, val=None):
+		set_field(self, "elem_type", type)
+		set_field(self, "v", val)
+
+	def __setattr__(self, name, value):
+		raise AttributeError("Value is immutable")
+
+	def val(self):
+		return self.v
+
+	def type(self):
+		return self.elem_type
+  
+	def __str__(self):
+		return str(self.v)
+
+
+set_field = object.__setattr__
+
+TRUE = Value(InterpreterBase.BOOL_DEF, True)
+FALSE = Value(InterpreterBase.BOOL_DEF, False)
+NIL = Value(InterpreterBase.NIL_DEF)
+
+SMALL_INT_MIN = -256
+SMALL_INT_MAX = 1024
+small_ints = [Value(InterpreterBase.INT_DEF, i) for i in range(SMALL_INT_MIN, SMALL_INT_MAX + 1)]
+
+
+def int_value(val):
+	if SMALL_INT_MIN <= val <= SMALL_INT_MAX:
+		return small_ints[val - SMALL_INT_MIN]
+	return Value(InterpreterBase.INT_DEF, val)
+
+
+def bool_value(val):
+	return TRUE if val else FALSE
+
+
+def string_value(val):
+	return Value(InterpreterBase.STRING_DEF, val)
+
+
+# The Value for a literal node's elem_type and val
+def literal_value(elem_type, val):
+	match elem_type:
+		case InterpreterBase.INT_DEF:
+			return int_value(val)
+		case InterpreterBase.BOOL_DEF:
+			return bool_value(val)
+		case InterpreterBase.NIL_DEF:
+			return NIL
+	return Value(elem_type, val)
+
+
+def create_value(val):
+	if val == InterpreterBase.TRUE_DEF:
+		return Value(Type.BOOL, True)
+	elif val == InterpreterBase.FALSE_DEF:
+		return Value(Type.BOOL, False)
+	elif val == InterpreterBase.NIL_DEF:
+		return Value(Type.NIL, None)
+	elif isinstance(val, str):
+		return Value(Type.STRING, val)
+	elif isinstance(val, int):
+		return Value(Type.INT, val)
+	else:
+		raise ValueError("Unknown value type")
\ No newline at end of file